@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+import time
+
+# Maintenance commands for a store database, run without starting the POS:
+#
+# python pos_admin.py [--db PATH] rebuild-rollup
+# python pos_admin.py [--db PATH] import-products FILE.csv [--rejects FILE.csv]
+# python pos_admin.py [--db PATH] export-sales FILE [--from DATE] [--to DATE]
+#     [--format csv|jsonl] [--gzip] [--resume]
+# python pos_admin.py [--db PATH] backup FILE [--gzip]
+# python pos_admin.py [--db PATH] backup DIR --incremental
+# python pos_admin.py [--db PATH] verify-backup FILE
+# python pos_admin.py [--db PATH] restore FILE [--yes]
+# python pos_admin.py [--db PATH] restore DIR --incremental [--deltas N] [--yes]
+# python pos_admin.py [--db PATH] trace on|off|status [--slow-ms N]
+
+def rebuild_rollup(args):
+    import pos_services as services
+    start = time.perf_counter()
+    rows = services.rebuild_daily_rollup()
+    print(f"Rebuilt daily rollup: {rows} rows in {time.perf_counter() - start:.2f} s")
+
+def import_products(args):
+    import pos_transfer
+
+    def progress(counts):
+        print(f"\r{counts['rows']:,} rows", end='', flush=True)
+
+    start = time.perf_counter()
+    try:
+        counts = pos_transfer.import_products(args.file, args.chunk_rows, args.rejects, progress)
+    except (OSError, pos_transfer.ImportFormatError) as e:
+        print(f"Import failed: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"\rImported {counts['rows']:,} rows in {elapsed:.2f} s ({counts['rows'] / elapsed:,.0f} rows/sec): "
+          f"{counts['inserted']:,} inserted, {counts['updated']:,} updated, "
+          f"{counts['unchanged']:,} unchanged, {counts['rejected']:,} rejected")
+    if counts['rejected'] and args.rejects:
+        print(f"Rejected rows written to {args.rejects}")
+
+def export_sales(args):
+    import pos_transfer
+    fmt = args.format or ('jsonl' if '.jsonl' in args.file else 'csv')
+    compress = args.gzip or args.file.endswith('.gz')
+
+    def progress(state):
+        print(f"\r{state['sales']:,} sales, {state['lines']:,} lines (sale id {state['done_id']:,} of "
+              f"{state['last_id']:,})", end='', flush=True)
+
+    start = time.perf_counter()
+    try:
+        counts = pos_transfer.export_sales(args.file, args.start, args.end, fmt, compress, args.resume,
+                                           progress=progress)
+    except (OSError, ValueError) as e:
+        print(f"Export failed: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"\rExported {counts['sales']:,} sales ({counts['lines']:,} lines) to {args.file} in {elapsed:.2f} s "
+          f"({counts['lines'] / elapsed:,.0f} lines/sec)")
+
+def backup(args):
+    import pos_backup
+    if args.incremental:
+        try:
+            result = pos_backup.incremental_backup(args.file)
+        except (OSError, pos_backup.BackupError) as e:
+            print(f"Backup failed: {e}")
+            sys.exit(1)
+        if result['kind'] == 'none':
+            print(f"No changes since the last backup ({result['seconds']:.2f} s)")
+        elif result['kind'] == 'base':
+            print(f"Started a new chain in {args.file}: full backup {result['file']} "
+                  f"({result['bytes'] / 1048576:,.1f} MB) in {result['seconds']:.2f} s")
+        else:
+            print(f"Wrote {result['file']}: {result['changes']:,} changed rows, "
+                  f"{result['bytes'] / 1024:,.1f} KB in {result['seconds']:.2f} s")
+        return
+
+    def progress(done, total):
+        print(f"\r{done:,} / {total:,} pages", end='', flush=True)
+
+    try:
+        result = pos_backup.backup(args.file, args.gzip or None, args.step_pages, progress=progress)
+    except (OSError, pos_backup.BackupError) as e:
+        print(f"\nBackup failed: {e}")
+        sys.exit(1)
+    print(f"\rBacked up {result['pages']:,} pages to {args.file} ({result['bytes'] / 1048576:,.1f} MB"
+          f"{', gzipped' if result['compressed'] else ''}) in {result['seconds']:.2f} s: "
+          f"copy {result['copy_seconds']:.2f} s in {result['steps']} steps, "
+          f"integrity check {result['check_seconds']:.2f} s")
+
+def verify_backup(args):
+    import pos_backup
+    try:
+        info = pos_backup.verify(args.file)
+    except (OSError, pos_backup.BackupError) as e:
+        print(f"Verify failed: {e}")
+        sys.exit(1)
+    print(f"{args.file} is OK: schema version {info['schema_version']}, {info['sales']:,} sales")
+
+def restore(args):
+    import pos_backup
+    if not args.yes:
+        confirm = input(f"This will overwrite {os.environ.get('POS_DB_PATH', 'pos_database.db')} "
+                        f"with {args.file}. Continue? (y/n): ").lower()
+        if confirm != 'y':
+            print("Restore canceled.")
+            return
+    try:
+        if args.incremental:
+            info = pos_backup.restore_incremental(args.file, args.deltas)
+        else:
+            info = pos_backup.restore(args.file)
+    except (OSError, pos_backup.BackupError) as e:
+        print(f"Restore failed: {e}")
+        sys.exit(1)
+    if args.incremental:
+        print(f"Restored {args.file} (base + {info['deltas']} deltas, {info['sales']:,} sales) in "
+              f"{info['seconds']:.2f} s: base {info['base_seconds']:.2f} s, "
+              f"replay {info['replay_seconds']:.2f} s, validation {info['validate_seconds']:.2f} s")
+    else:
+        print(f"Restored {args.file} ({info['sales']:,} sales) in {info['seconds']:.2f} s "
+              f"(validation {info['validate_seconds']:.2f} s)")
+
+def trace(args):
+    import pos_services as services
+    from pos_db import SLOW_QUERY_LOG, TRACE_REFRESH_SECONDS
+    if args.action != 'status' or args.slow_ms is not None:
+        if args.action == 'status':
+            services.set_settings({'slow_query_ms': args.slow_ms})
+        else:
+            services.set_sql_trace(args.action == 'on', args.slow_ms)
+        print(f"Running tills pick this up within {TRACE_REFRESH_SECONDS:.0f} s.")
+    settings = services.get_settings()
+    print(f"SQL tracing {'on' if settings.get('sql_trace') == '1' else 'off'}, statements slower than "
+          f"{settings.get('slow_query_ms')} ms are logged to each till's {SLOW_QUERY_LOG}")
+
+def main():
+    parser = argparse.ArgumentParser(description='POS database maintenance')
+    parser.add_argument('--db', help='database file (default: POS_DB_PATH or pos_database.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild-rollup', help='recompute the daily sales rollup from the sales table')
+    importer = commands.add_parser('import-products', help='add or update products from a CSV file')
+    importer.add_argument('file', help='CSV with a header row: barcode,name,price[,stock]')
+    importer.add_argument('--rejects', help='write rejected rows and the reason to this CSV')
+    importer.add_argument('--chunk-rows', type=int, default=5000, help='rows per transaction')
+    exporter = commands.add_parser('export-sales', help='export sale lines to CSV or JSON lines')
+    exporter.add_argument('file', help='output file (.csv, .jsonl, optionally .gz)')
+    exporter.add_argument('--from', dest='start', help='first sale date (YYYY-MM-DD)')
+    exporter.add_argument('--to', dest='end', help='last sale date (YYYY-MM-DD)')
+    exporter.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file name, else csv')
+    exporter.add_argument('--gzip', action='store_true', help='gzip the output (default for .gz names)')
+    exporter.add_argument('--resume', action='store_true', help='continue an interrupted export')
+    backuper = commands.add_parser('backup', help='online backup of the database, checked before it is kept')
+    backuper.add_argument('file', help='backup file (gzipped for .gz names), or directory with --incremental')
+    backuper.add_argument('--gzip', action='store_true', help='gzip the backup')
+    backuper.add_argument('--incremental', action='store_true',
+                          help='add the changes since the last backup to the chain in this directory')
+    backuper.add_argument('--step-pages', type=int, default=256, help='pages copied between pauses')
+    verifier = commands.add_parser('verify-backup', help='check a backup file without restoring it')
+    verifier.add_argument('file')
+    restorer = commands.add_parser('restore', help='replace the database with a checked backup')
+    restorer.add_argument('file', help='backup file, or directory with --incremental')
+    restorer.add_argument('--incremental', action='store_true', help='replay a base backup and its deltas')
+    restorer.add_argument('--deltas', type=int, help='replay only the first N deltas')
+    restorer.add_argument('--yes', action='store_true', help='do not ask for confirmation')
+    tracer = commands.add_parser('trace', help='switch SQL tracing and the slow query log for every till')
+    tracer.add_argument('action', choices=['on', 'off', 'status'])
+    tracer.add_argument('--slow-ms', type=float, help='log statements slower than this many milliseconds')
+    args = parser.parse_args()
+
+    # pos_db reads the path at import time
+    if args.db:
+        if not os.path.exists(args.db):
+            print(f"Database {args.db} not found.")
+            sys.exit(1)
+        os.environ['POS_DB_PATH'] = args.db
+    from pos_db import writer, close_pool
+    from pos_migrations import migrate
+
+    try:
+        with writer() as conn:
+            migrate(conn, verbose=True)
+        if args.command == 'rebuild-rollup':
+            rebuild_rollup(args)
+        elif args.command == 'import-products':
+            import_products(args)
+        elif args.command == 'export-sales':
+            export_sales(args)
+        elif args.command == 'backup':
+            backup(args)
+        elif args.command == 'verify-backup':
+            verify_backup(args)
+        elif args.command == 'restore':
+            restore(args)
+        elif args.command == 'trace':
+            trace(args)
+    finally:
+        close_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from pos_db import DB_PATH, reader, writer, begin_immediate
+from pos_migrations import migrate, LATEST_VERSION, TRACKED_TABLES
+
+# Online backup and restore of the store database with SQLite's backup API.
+# A backup copies pages from a read snapshot a few hundred at a time with a
+# short pause in between, so the tills keep checking out while it runs
+# (in WAL mode a reader never blocks a writer). Every backup is checked with
+# integrity_check before it is kept, and a restore checks the file again
+# and copies it into the live database in one transaction, so other
+# connections see either the old database or the restored one.
+
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_PAUSE = 0.005
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+REQUIRED_TABLES = ('users', 'products', 'customers', 'sales', 'sale_items')
+
+
+class BackupError(Exception):
+    pass
+
+
+def _check(conn, name):
+    # integrity_check returns a single 'ok' row, or up to 100 problem rows
+    problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    if problems != ['ok']:
+        raise BackupError(f"{name} failed the integrity check: {'; '.join(problems[:3])}")
+
+def _temp_path(path):
+    return f"{path}.{os.getpid()}.tmp"
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def _compress(source, target):
+    with open(source, 'rb') as f, gzip.open(target, 'wb', compresslevel=6) as out:
+        shutil.copyfileobj(f, out, 1024 * 1024)
+
+def _change_seq(conn, schema='main'):
+    # Last change_log seq handed out (0 before the first change)
+    row = conn.execute(f"SELECT seq FROM {schema}.sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def is_compressed(path):
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+def backup(backup_file, compress=None, step_pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_PAUSE, progress=None):
+    # Copy the live database to backup_file (gzipped when compress is set,
+    # by default for .gz names). Returns pages, bytes and timings.
+    if compress is None:
+        compress = backup_file.endswith('.gz')
+    temp = _temp_path(backup_file)
+    started = time.perf_counter()
+    steps = 0
+
+    def step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress:
+            progress(total - remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        target = sqlite3.connect(temp)
+        try:
+            with reader() as conn:
+                # Pin one read snapshot for the whole copy; otherwise every
+                # sale committed meanwhile would restart the backup
+                conn.execute('BEGIN')
+                conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                conn.backup(target, pages=step_pages, progress=step)
+            copied = time.perf_counter() - started
+            # A copy of a WAL database is in WAL mode too; make it one file
+            target.execute('PRAGMA journal_mode = DELETE')
+            _check(target, 'The backup')
+            pages = target.execute('PRAGMA page_count').fetchone()[0]
+            change_seq = _change_seq(target)
+        finally:
+            target.close()
+        checked = time.perf_counter() - started
+
+        if compress:
+            packed = _temp_path(backup_file + '.gz')
+            try:
+                _compress(temp, packed)
+                os.replace(packed, backup_file)
+            finally:
+                _remove(packed)
+            _remove(temp)
+        else:
+            os.replace(temp, backup_file)
+    finally:
+        _remove(temp)
+    return {
+        'pages': pages,
+        'steps': steps,
+        'bytes': os.path.getsize(backup_file),
+        'compressed': compress,
+        'change_seq': change_seq,
+        'copy_seconds': copied,
+        'check_seconds': checked - copied,
+        'seconds': time.perf_counter() - started,
+    }
+
+def _open_backup(path):
+    # Returns (path to an uncompressed copy, is temporary)
+    if not os.path.exists(path):
+        raise BackupError(f"Backup file {path} not found.")
+    if not is_compressed(path):
+        return path, False
+    temp = _temp_path(path + '.restore')
+    try:
+        with gzip.open(path, 'rb') as f, open(temp, 'wb') as out:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+    except (OSError, EOFError) as e:
+        _remove(temp)
+        raise BackupError(f"{path} is not a readable gzip file: {e}")
+    return temp, True
+
+def _validate(path, name):
+    with open(path, 'rb') as f:
+        if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+            raise BackupError(f"{name} is not a SQLite database.")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        _check(conn, name)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [table for table in REQUIRED_TABLES if table not in tables]
+        if missing:
+            raise BackupError(f"{name} is not a POS database (missing {', '.join(missing)}).")
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > LATEST_VERSION:
+            raise BackupError(f"{name} has schema version {version}, newer than this POS ({LATEST_VERSION}).")
+        sales = conn.execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+    finally:
+        conn.close()
+    return {'schema_version': version, 'sales': sales}
+
+def verify(backup_file):
+    # Check a backup without restoring it. Returns its schema version and
+    # number of sales; raises BackupError if it is unusable.
+    path, temporary = _open_backup(backup_file)
+    try:
+        return _validate(path, backup_file)
+    finally:
+        if temporary:
+            _remove(path)
+
+def restore(backup_file):
+    # Replace the live database with a validated backup, then bring it up
+    # to the current schema. The copy runs as one write transaction on the
+    # live database, so no connection ever sees a half restored file.
+    started = time.perf_counter()
+    path, temporary = _open_backup(backup_file)
+    try:
+        info = _validate(path, backup_file)
+        validated = time.perf_counter() - started
+        source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            with writer() as conn:
+                try:
+                    source.backup(conn)
+                except sqlite3.OperationalError as e:
+                    raise BackupError(f"Could not restore {backup_file}: {e}")
+                migrate(conn)
+                # New generations, so no till serves a report or product
+                # cached before the restore (pos_services, pos_cache)
+                conn.execute('UPDATE sales_generation SET generation = random()')
+                conn.execute('UPDATE products_generation SET generation = random()')
+        finally:
+            source.close()
+    finally:
+        if temporary:
+            _remove(path)
+    info['validate_seconds'] = validated
+    info['seconds'] = time.perf_counter() - started
+    return info
+
+
+# Incremental backups. A backup directory holds one chain: a full base
+# snapshot plus delta files, listed in order in manifest.json. Each delta is
+# a small SQLite file with the current version of every row logged in
+# change_log since the previous backup, and the ids of all logged rows (so
+# deleted rows are deleted on replay). The database records the chain id
+# and the last seq backed up in backup_state; a new base is taken whenever
+# they do not match the manifest (first run, after a restore, after a
+# schema upgrade), since the deltas would no longer apply. Nothing is logged
+# until the first base backup starts a chain.
+
+MANIFEST = 'manifest.json'
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    temp = _temp_path(path)
+    with open(temp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+def _backup_state():
+    with reader() as conn:
+        state = conn.execute('SELECT chain, last_seq FROM backup_state WHERE id = 1').fetchone()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+    return (state['chain'], state['last_seq']) if state else (None, None), version
+
+def _mark_backed_up(chain, last_seq=None):
+    # Record how far the chain got and drop the log entries it covers
+    # (without last_seq, everything logged so far)
+    with writer() as conn:
+        begin_immediate(conn)
+        if last_seq is None:
+            last_seq = _change_seq(conn)
+        conn.execute('''
+            INSERT INTO backup_state (id, chain, last_seq) VALUES (1, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                chain = excluded.chain, last_seq = excluded.last_seq, updated_at = CURRENT_TIMESTAMP
+        ''', (chain, last_seq))
+        conn.execute('DELETE FROM change_log WHERE seq <= ?', (last_seq,))
+
+def _write_delta(path, after_seq):
+    # Copy the rows logged after after_seq into a new delta file, all read
+    # from one snapshot of the live database. Returns (last seq, rows).
+    conn = sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True, isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS delta', (path,))
+        conn.execute('BEGIN')
+        last_seq = _change_seq(conn)
+        conn.execute('''
+            CREATE TABLE delta.changes (
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                PRIMARY KEY (table_name, row_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO delta.changes (table_name, row_id)
+            SELECT table_name, row_id FROM main.change_log WHERE seq > ? AND seq <= ?
+        ''', (after_seq, last_seq))
+        rows = 0
+        for table in TRACKED_TABLES:
+            # Stored columns only: generated ones are recomputed on replay
+            columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA main.table_info({table})'))
+            conn.execute(f'CREATE TABLE delta.{table} AS SELECT {columns} FROM main.{table} WHERE 0')
+            rows += conn.execute(f'''
+                INSERT INTO delta.{table} SELECT {columns} FROM main.{table}
+                WHERE id IN (SELECT row_id FROM delta.changes WHERE table_name = ?)
+            ''', (table,)).rowcount
+        changes = conn.execute('SELECT COUNT(*) FROM delta.changes').fetchone()[0]
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return last_seq, changes, rows
+
+def incremental_backup(directory, compress=True):
+    # Add a delta to the chain in directory, or start the chain with a full
+    # base backup. Returns what was written and how long it took.
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    (chain, last_seq), version = _backup_state()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    suffix = '.db.gz' if compress else '.db'
+
+    if (manifest is None or manifest['chain'] != chain or manifest['last_seq'] != last_seq
+            or manifest['schema_version'] != version):
+        name = f"base-{stamp}{suffix}"
+        # Changes are only logged while a chain exists: start it before the
+        # base snapshot, so nothing changed in between is missed
+        chain = uuid.uuid4().hex
+        _mark_backed_up(chain)
+        result = backup(os.path.join(directory, name), compress)
+        manifest = {
+            'chain': chain,
+            'schema_version': version,
+            'base': name,
+            'base_seq': result['change_seq'],
+            'last_seq': result['change_seq'],
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'deltas': [],
+        }
+        _write_manifest(directory, manifest)
+        _mark_backed_up(manifest['chain'], manifest['last_seq'])
+        return {'kind': 'base', 'file': name, 'bytes': result['bytes'], 'changes': None,
+                'seconds': time.perf_counter() - started}
+
+    name = f"delta-{len(manifest['deltas']) + 1:05d}-{stamp}{suffix}"
+    path = os.path.join(directory, name)
+    temp = _temp_path(path)
+    try:
+        _remove(temp)
+        to_seq, changes, rows = _write_delta(temp, last_seq)
+        if not changes:
+            return {'kind': 'none', 'file': None, 'bytes': 0, 'changes': 0,
+                    'seconds': time.perf_counter() - started}
+        if compress:
+            packed = _temp_path(path + '.gz')
+            try:
+                _compress(temp, packed)
+                os.replace(packed, path)
+            finally:
+                _remove(packed)
+        else:
+            os.replace(temp, path)
+    finally:
+        _remove(temp)
+    manifest['deltas'].append({'file': name, 'from_seq': last_seq, 'to_seq': to_seq,
+                               'changes': changes, 'rows': rows,
+                               'created_at': datetime.now().isoformat(timespec='seconds')})
+    manifest['last_seq'] = to_seq
+    _write_manifest(directory, manifest)
+    _mark_backed_up(manifest['chain'], to_seq)
+    return {'kind': 'delta', 'file': name, 'bytes': os.path.getsize(path), 'changes': changes,
+            'seconds': time.perf_counter() - started}
+
+def _replay_delta(conn, path):
+    # Apply one delta: delete every logged row, insert the saved versions,
+    # then recompute the rollup for the days whose sales changed. A base
+    # from before the integer sale days has its rollup rebuilt by the
+    # upgrade that restore runs, so it is left alone here.
+    conn.execute('ATTACH DATABASE ? AS delta', (path,))
+    try:
+        with conn:
+            by_day = any(row[1] == 'sale_day' for row in conn.execute('PRAGMA main.table_xinfo(sales)'))
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS replay_days (day INTEGER PRIMARY KEY)')
+            conn.execute('DELETE FROM temp.replay_days')
+            if by_day:
+                conn.execute('''
+                    INSERT OR IGNORE INTO temp.replay_days
+                    SELECT sale_day FROM main.sales
+                    WHERE id IN (SELECT row_id FROM delta.changes WHERE table_name = 'sales')
+                ''')
+            for table in TRACKED_TABLES:
+                stored = {row[1] for row in conn.execute(f'PRAGMA main.table_info({table})')}
+                columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA delta.table_info({table})')
+                                    if row[1] in stored)
+                conn.execute(f'''
+                    DELETE FROM main.{table}
+                    WHERE id IN (SELECT row_id FROM delta.changes WHERE table_name = ?)
+                ''', (table,))
+                conn.execute(f'INSERT INTO main.{table} ({columns}) SELECT {columns} FROM delta.{table}')
+            if by_day:
+                conn.execute('''
+                    INSERT OR IGNORE INTO temp.replay_days
+                    SELECT sale_day FROM main.sales
+                    WHERE id IN (SELECT row_id FROM delta.changes WHERE table_name = 'sales')
+                ''')
+                conn.execute('DELETE FROM daily_rollup WHERE day IN (SELECT day FROM temp.replay_days)')
+                conn.execute('''
+                    INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+                    SELECT d.day, s.payment_method, COUNT(*), SUM(s.total_amount), MIN(s.total_amount),
+                           MAX(s.total_amount)
+                    FROM temp.replay_days d
+                    JOIN sales s ON s.sale_day = d.day
+                    GROUP BY d.day, s.payment_method
+                ''')
+    finally:
+        conn.execute('DETACH DATABASE delta')
+
+def restore_incremental(directory, deltas=None):
+    # Rebuild the database from the chain's base and its first deltas (all
+    # of them by default) in a scratch file, then restore that like a full
+    # backup. Returns timings for each stage.
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        raise BackupError(f"No incremental backup in {directory}.")
+    chosen = manifest['deltas'] if deltas is None else manifest['deltas'][:deltas]
+    started = time.perf_counter()
+    work = _temp_path(os.path.join(directory, 'restore.db'))
+    try:
+        base, temporary = _open_backup(os.path.join(directory, manifest['base']))
+        if temporary:
+            os.replace(base, work)
+        else:
+            shutil.copyfile(base, work)
+        loaded = time.perf_counter() - started
+
+        conn = sqlite3.connect(work)
+        try:
+            for delta in chosen:
+                path, temporary = _open_backup(os.path.join(directory, delta['file']))
+                try:
+                    _replay_delta(conn, path)
+                except sqlite3.Error as e:
+                    raise BackupError(f"Could not apply {delta['file']}: {e}")
+                finally:
+                    if temporary:
+                        _remove(path)
+        finally:
+            conn.close()
+        replayed = time.perf_counter() - started
+
+        info = restore(work)
+    finally:
+        _remove(work)
+    info.update(deltas=len(chosen), base_seconds=loaded, replay_seconds=replayed - loaded,
+                seconds=time.perf_counter() - started)
+    return info
@@ -0,0 +1 @@
+# Benchmarks for the POS hot paths. Run a module with: python -m pos_bench.<name>
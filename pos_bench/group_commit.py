@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from pos_bench.scan_latency import percentile
+
+# Finalize throughput with several lanes finalizing at once in one process
+# (a self-checkout bank), with and without group commit.
+#
+# python -m pos_bench.group_commit [--lanes 8] [--sales 300]
+#     [--windows 0,1,2] [--synchronous normal|full]
+
+def run(services, Cart, Money, lanes, sales, products, seed):
+    latencies = []
+    lock = threading.Lock()
+
+    def lane(number):
+        rng = random.Random(seed + number)
+        samples = []
+        for _ in range(sales):
+            cart = Cart(number)
+            for _ in range(rng.randint(1, 5)):
+                services.add_to_cart(cart, product_id=rng.randint(1, products))
+            start = time.perf_counter()
+            services.finalize(cart, 1, cart.total + Money(500))
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=lane, args=(number,)) for number in range(lanes)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description='Group commit throughput benchmark')
+    parser.add_argument('--lanes', type=int, default=8)
+    parser.add_argument('--sales', type=int, default=300, help='sales per lane')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--windows', default='0,1,2', help='group commit windows to try, in ms')
+    parser.add_argument('--synchronous', choices=['normal', 'full'], default='normal')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='pos_bench_')
+    path = os.path.join(workdir, 'pos_database.db')
+    os.environ['POS_DB_PATH'] = path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pos_db
+    import pos_system
+    import pos_services as services
+    from pos_cache import product_cache
+    from pos_cart import Cart
+    from pos_money import Money
+
+    pos_system.init_db()
+    with pos_db.writer() as conn:
+        conn.execute(f'PRAGMA synchronous = {args.synchronous.upper()}')
+        conn.executemany('INSERT INTO products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                         ((f"{i:012d}", f"Product {i}", 100 + i % 50 * 100, 10 ** 6) for i in range(args.products)))
+    product_cache.load()
+
+    print(f"{args.lanes} lanes x {args.sales} sales, synchronous={args.synchronous} ({path})")
+    print(f"{'':<16} {'sales/sec':>10} {'p50 ms':>8} {'p99 ms':>8} {'sales/commit':>13}")
+    modes = [('direct', None)] + [(f"group {window:g} ms", window)
+                                  for window in map(float, args.windows.split(','))]
+    for label, window in modes:
+        services.set_group_commit(window)
+        elapsed, latencies = run(services, Cart, Money, args.lanes, args.sales, args.products, args.seed)
+        committer = services.group_committer
+        if committer:
+            stats = committer.stats()
+            per_commit = stats['sales'] / stats['batches']
+        else:
+            per_commit = 1
+        print(f"{label:<16} {len(latencies) / elapsed:>10.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f} {per_commit:>13.1f}")
+    services.set_group_commit(None)
+    pos_db.close_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from pos_bench.scan_latency import percentile
+
+# Sales journal throughput: finalize latency with the journal on and off,
+# and journal appends from several threads at once (group fsync).
+#
+# python -m pos_bench.journal [--sales 1000] [--threads 8]
+#     [--appends 2000] [--dir DIR]
+#
+# --dir puts the database and journal on the storage to be measured (an SD
+# card, say); the default is a temporary directory.
+
+def finalize_run(services, Cart, Money, sales, products, seed):
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(sales):
+        cart = Cart(1)
+        for _ in range(rng.randint(1, 5)):
+            services.add_to_cart(cart, product_id=rng.randint(1, products))
+        began = time.perf_counter()
+        services.finalize(cart, 1, cart.total + Money(500))
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - start, latencies
+
+def append_run(SalesJournal, path, threads, appends):
+    # Appends only (nothing drains), so this is the journal's own ceiling
+    journal = SalesJournal(path, lambda entries: None)
+    entry = {'key': 'bench', 'sale_date': '2024-01-01 00:00:00', 'customer_id': None, 'user_id': 1,
+             'total': 1234, 'amount_paid': 1500, 'change': 266, 'payment_method': 'cash',
+             'items': [(1, 1, 617), (2, 1, 617)]}
+
+    def worker():
+        for _ in range(appends):
+            journal.append(entry)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    fsyncs = journal.fsyncs
+    journal._file.close()
+    os.remove(path)
+    return elapsed, fsyncs
+
+def main():
+    parser = argparse.ArgumentParser(description='Sales journal throughput benchmark')
+    parser.add_argument('--sales', type=int, default=1000, help='sales finalized per mode')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help='threads for the append test')
+    parser.add_argument('--appends', type=int, default=2000, help='appends per thread')
+    parser.add_argument('--dir', help='directory for the database and journal (default: a temporary one)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='pos_bench_', dir=args.dir)
+    os.environ['POS_DB_PATH'] = os.path.join(workdir, 'pos_database.db')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pos_db
+    import pos_system
+    import pos_services as services
+    from pos_cache import product_cache
+    from pos_cart import Cart
+    from pos_journal import SalesJournal
+    from pos_money import Money
+
+    pos_system.init_db()
+    with pos_db.writer() as conn:
+        conn.executemany('INSERT INTO products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                         ((f"{i:012d}", f"Product {i}", 100 + i % 50 * 100, 10 ** 6) for i in range(args.products)))
+    product_cache.load()
+
+    print(f"{args.sales} sales per mode ({workdir})")
+    print(f"{'':<10} {'sales/sec':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label in ('direct', 'journal'):
+        if label == 'journal':
+            services.open_sales_journal(os.path.join(workdir, 'lane1.journal'))
+        elapsed, latencies = finalize_run(services, Cart, Money, args.sales, args.products, args.seed)
+        print(f"{label:<10} {len(latencies) / elapsed:>10.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f}")
+    started = time.perf_counter()
+    services.close_sales_journal()
+    print(f"Journal drained into the database in {time.perf_counter() - started:.2f} s")
+
+    print(f"\nJournal appends, {args.appends} per thread")
+    print(f"{'threads':<10} {'appends/sec':>12} {'appends/fsync':>14}")
+    for threads in sorted({1, args.threads}):
+        elapsed, fsyncs = append_run(SalesJournal, os.path.join(workdir, 'append.journal'), threads, args.appends)
+        total = threads * args.appends
+        print(f"{threads:<10} {total / elapsed:>12.0f} {total / max(fsyncs, 1):>14.1f}")
+    pos_db.close_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Per-scan barcode lookup latency: connect-per-call (the old get_db_connection)
+# against the pooled connections in pos_db and the in-memory product cache.
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def connect_per_call(path, barcodes):
+    samples = []
+    for barcode in barcodes:
+        start = time.perf_counter()
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute('SELECT * FROM products WHERE barcode = ?', (barcode,)).fetchone()
+        conn.close()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def pooled(reader, barcodes):
+    samples = []
+    for barcode in barcodes:
+        start = time.perf_counter()
+        with reader() as conn:
+            conn.execute('SELECT * FROM products WHERE barcode = ?', (barcode,)).fetchone()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def cached(cache, barcodes):
+    samples = []
+    for barcode in barcodes:
+        start = time.perf_counter()
+        cache.get_by_barcode(barcode)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def report(label, samples):
+    print(f"{label:<18} {percentile(samples, 50) * 1e6:>9.1f} {percentile(samples, 95) * 1e6:>9.1f} "
+          f"{percentile(samples, 99) * 1e6:>9.1f} {len(samples) / sum(samples):>12.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Barcode scan latency benchmark')
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--scans', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='pos_bench_')
+    path = os.path.join(workdir, 'pos_database.db')
+    os.environ['POS_DB_PATH'] = path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pos_db
+    import pos_system
+    from pos_cache import ProductCache
+
+    pos_system.init_db()
+    with pos_db.writer() as conn:
+        conn.executemany('INSERT INTO products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                         ((f"{i:012d}", f"Product {i}", 100 + i % 50 * 100, 100) for i in range(args.products)))
+
+    rng = random.Random(args.seed)
+    barcodes = [f"{rng.randrange(args.products):012d}" for _ in range(args.scans)]
+
+    print(f"{args.scans} scans over {args.products} products ({path})")
+    print(f"{'':<18} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'scans/sec':>12}")
+    report('connect-per-call', connect_per_call(path, barcodes))
+    report('pooled', pooled(pos_db.reader, barcodes))
+    cache = ProductCache()
+    cache.load()
+    report('cached', cached(cache, barcodes))
+    bounded = ProductCache(max_size=args.products // 10)
+    report('cached (10% LRU)', cached(bounded, barcodes))
+    print(f"LRU cache: {bounded.stats()}")
+    pos_db.close_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from pos_bench.scan_latency import percentile
+from pos_bench import synthetic
+from pos_money import Money
+
+# End-to-end timings of the POS hot paths against a synthetic store.
+# Each operation is driven through pos_services exactly as the menus call
+# it, on a scratch copy of the database so runs never change the source.
+#
+# python -m pos_bench.suite --db store.db [--json results.json]
+#     [--compare previous.json]
+#
+# A missing --db is generated first (see pos_bench.synthetic for sizes).
+# Results give p50/p95/p99 in milliseconds and rows/sec per operation;
+# --compare prints the p50 change against an earlier JSON run.
+
+SMALL_BASKET = 3
+LARGE_BASKET = 120
+REPORT_DAYS = 30
+
+
+class Bench:
+    # Times one operation; func returns the number of rows it handled.
+    # setup, if given, runs untimed before each run.
+
+    def __init__(self, name, func, runs, setup=None):
+        self.name = name
+        self.func = func
+        self.runs = runs
+        self.setup = setup
+
+    def run(self, rng):
+        samples = []
+        rows = 0
+        for _ in range(self.runs):
+            if self.setup:
+                self.setup(rng)
+            start = time.perf_counter()
+            rows += self.func(rng)
+            samples.append(time.perf_counter() - start)
+        return {
+            'runs': len(samples),
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'rows': rows,
+            'rows_per_sec': rows / sum(samples) if sum(samples) else 0.0,
+        }
+
+
+def build_benches(services, product_cache, Cart, store, workdir, args):
+    products = store['products']
+    max_sale = store['max_sale_id']
+    last_day = store['last_day']
+    first_report_day = store['report_start']
+    sold_out = set()
+
+    def lookup(rng):
+        services.lookup_barcode(synthetic.barcode(rng.randint(1, products)))
+        return 1
+
+    def lookup_uncached(rng):
+        # Bypass the product cache (cache miss path)
+        product_id = rng.randint(1, products)
+        product_cache.remove(product_id)
+        product = services.lookup_barcode(synthetic.barcode(product_id))
+        return 1 if product else 0
+
+    def finalize(size):
+        def run(rng):
+            cart = Cart()
+            while len(cart) < size:
+                product_id = rng.randint(1, products)
+                if product_id in sold_out or product_id in cart:
+                    continue
+                try:
+                    services.add_to_cart(cart, product_id=product_id)
+                except services.InsufficientStockError:
+                    sold_out.add(product_id)
+            rows = cart.item_count
+            services.finalize(cart, user_id=1, amount_paid=cart.total + Money(100))
+            return rows
+        return run
+
+    def view_all_sales(rng):
+        return len(services.sales_page())
+
+    def view_sales_range(rng):
+        return len(services.sales_page(first_report_day, last_day))
+
+    def view_sales_deep_page(rng):
+        # A page from somewhere in the middle of the history
+        anchor = services.get_sale(rng.randint(1, max_sale))[0]
+        after = services.page_key(anchor) if anchor else None
+        return len(services.sales_page(after=after))
+
+    def stream_all_sales(rng):
+        return sum(1 for _ in services.iter_sales())
+
+    def view_sale_details(rng):
+        sale, items = services.get_sale(rng.randint(1, max_sale))
+        return len(items) + (1 if sale else 0)
+
+    def report(func, full_range, cached=False):
+        # Uncached runs drop the report cache first (the first run of a
+        # report and range); cached runs repeat it
+        def run(rng):
+            if not cached:
+                services.report_cache.clear()
+            result = func() if full_range else func(first_report_day, last_day)
+            return len(result) if isinstance(result, list) else 1
+        return run
+
+    def monthly(rng):
+        services.report_cache.clear()
+        return len(services.monthly_sales(first_report_day[:7], last_day[:7]))
+
+    # Setup for a repeat run with a new sale since the last one (served
+    # from the cache plus that sale)
+    record_sale = finalize(SMALL_BASKET)
+
+    deletable = list(range(1, max_sale + 1))
+    random.Random(args.seed).shuffle(deletable)
+
+    def delete_sale(rng):
+        return 1 if services.delete_sale(deletable.pop()) else 0
+
+    import pos_backup
+    backup_path = os.path.join(workdir, 'backup.db')
+
+    def backup(rng):
+        pos_backup.backup(backup_path)
+        with sqlite3.connect(backup_path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM sale_items').fetchone()[0]
+
+    runs = args.runs
+    heavy = args.heavy_runs
+    return [
+        Bench('lookup_barcode', lookup, runs * 20),
+        Bench('lookup_barcode_uncached', lookup_uncached, runs * 5),
+        Bench('finalize_small', finalize(SMALL_BASKET), runs),
+        Bench('finalize_large', finalize(LARGE_BASKET), max(1, runs // 5)),
+        Bench('view_all_sales', view_all_sales, heavy),
+        Bench(f'view_sales_{REPORT_DAYS}d', view_sales_range, runs),
+        Bench('view_sales_deep_page', view_sales_deep_page, runs),
+        Bench('stream_all_sales', stream_all_sales, heavy),
+        Bench('view_sale_details', view_sale_details, runs * 5),
+        Bench('sales_summary', report(services.sales_summary, True), heavy),
+        Bench(f'sales_summary_{REPORT_DAYS}d', report(services.sales_summary, False), runs),
+        Bench('sales_summary_cached', report(services.sales_summary, True, cached=True), runs),
+        Bench('product_sales', report(services.product_sales, True), heavy),
+        Bench(f'product_sales_{REPORT_DAYS}d', report(services.product_sales, False), runs),
+        Bench('product_sales_cached', report(services.product_sales, True, cached=True), runs),
+        Bench('product_sales_after_sale', report(services.product_sales, True, cached=True), runs,
+              setup=record_sale),
+        Bench('daily_sales', report(services.daily_sales, True), heavy),
+        Bench('daily_sales_after_sale', report(services.daily_sales, True, cached=True), runs,
+              setup=record_sale),
+        Bench('monthly_sales', report(services.monthly_sales, True), heavy),
+        Bench(f'monthly_sales_{REPORT_DAYS}d', monthly, runs),
+        Bench('delete_sale', delete_sale, runs),
+        Bench('backup', backup, heavy),
+    ]
+
+def describe_store(path):
+    with sqlite3.connect(path) as conn:
+        products, customers = conn.execute(
+            'SELECT (SELECT COUNT(*) FROM products), (SELECT COUNT(*) FROM customers)').fetchone()
+        sales, max_sale, last = conn.execute('SELECT COUNT(*), MAX(id), MAX(sale_date) FROM sales').fetchone()
+        sale_items = conn.execute('SELECT COUNT(*) FROM sale_items').fetchone()[0]
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+    last_day = (last or datetime.now().strftime('%Y-%m-%d'))[:10]
+    report_start = datetime.fromordinal(datetime.strptime(last_day, '%Y-%m-%d').toordinal() - REPORT_DAYS + 1)
+    return {
+        'products': products,
+        'customers': customers,
+        'sales': sales,
+        'sale_items': sale_items,
+        'max_sale_id': max_sale or 0,
+        'last_day': last_day,
+        'report_start': report_start.strftime('%Y-%m-%d'),
+        'schema_version': version,
+        'size_mb': os.path.getsize(path) / 1e6,
+    }
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def print_results(results, previous=None):
+    print(f"{'':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows/sec':>12}" + ("   p50 vs prev" if previous else ""))
+    for name, result in results.items():
+        line = (f"{name:<26} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+                f"{result['rows_per_sec']:>12.0f}")
+        old = (previous or {}).get(name)
+        if old and old['p50_ms']:
+            line += f"   {result['p50_ms'] / old['p50_ms']:>6.2f}x"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='POS hot path benchmark suite')
+    parser.add_argument('--db', default='pos_bench_store.db', help='synthetic store (generated if missing)')
+    parser.add_argument('--products', type=int, default=synthetic.DEFAULT_PRODUCTS)
+    parser.add_argument('--customers', type=int, default=synthetic.DEFAULT_CUSTOMERS)
+    parser.add_argument('--sale-items', type=int, default=synthetic.DEFAULT_SALE_ITEMS)
+    parser.add_argument('--years', type=int, default=synthetic.DEFAULT_YEARS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=50, help='runs for the fast operations')
+    parser.add_argument('--heavy-runs', type=int, default=5, help='runs for full-history scans and backup')
+    parser.add_argument('--only', help='comma separated operation names to run')
+    parser.add_argument('--json', help='write results to this file ("-" for stdout)')
+    parser.add_argument('--compare', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    if not os.path.exists(args.db):
+        print(f"Generating synthetic store {args.db}")
+        synthetic.generate(args.db, args.products, args.customers, args.sale_items, args.years, args.seed,
+                           verbose=True)
+
+    # Work on a scratch copy: finalize and delete_sale change the data
+    workdir = tempfile.mkdtemp(prefix='pos_bench_')
+    path = os.path.join(workdir, 'pos_database.db')
+    shutil.copy2(args.db, path)
+    os.environ['POS_DB_PATH'] = path
+    import pos_db
+    import pos_services as services
+    from pos_migrations import migrate
+    from pos_cache import product_cache
+    from pos_cart import Cart
+
+    try:
+        with pos_db.writer() as conn:
+            migrate(conn)
+        store = describe_store(path)
+        load_start = time.perf_counter()
+        product_cache.load()
+        cache_load = time.perf_counter() - load_start
+        print(f"{store['products']:,} products, {store['customers']:,} customers, {store['sales']:,} sales, "
+              f"{store['sale_items']:,} sale items ({store['size_mb']:.0f} MB); cache load {cache_load:.2f} s")
+
+        benches = build_benches(services, product_cache, Cart, store, workdir, args)
+        if args.only:
+            wanted = set(args.only.split(','))
+            benches = [bench for bench in benches if bench.name in wanted]
+        rng = random.Random(args.seed)
+        results = {}
+        for bench in benches:
+            results[bench.name] = bench.run(rng)
+    finally:
+        pos_db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+    print_results(results, previous)
+
+    output = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'store': store,
+        'cache_load_seconds': cache_load,
+        'contention': pos_db.contention.snapshot(),
+        'results': results,
+    }
+    if args.json == '-':
+        print(json.dumps(output, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == '__main__':
+    main()
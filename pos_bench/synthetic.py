@@ -0,0 +1,229 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pos_migrations import migrate, phone_key
+
+# Reproducible synthetic store: products, customers, cashiers and years of
+# sales history, written with the real schema (pos_migrations) so every
+# benchmark runs against the same tables and indexes as a till. The same
+# seed and sizes always produce the same database.
+#
+# python -m pos_bench.synthetic --db store.db [--products 50000]
+#     [--customers 100000] [--sale-items 10000000] [--years 3] [--seed 1]
+
+DEFAULT_PRODUCTS = 50000
+DEFAULT_CUSTOMERS = 100000
+DEFAULT_SALE_ITEMS = 10000000
+DEFAULT_YEARS = 3
+DEFAULT_END_DATE = '2024-12-31'
+CASHIERS = 12
+CHUNK_ROWS = 50000
+
+# Basket sizes: mostly small, with a long tail of large shops
+BASKET_MEAN = 9
+BASKET_MAX = 80
+# Share of sales with a customer attached
+CUSTOMER_SALE_RATE = 0.4
+PAYMENT_METHODS = ['cash', 'cash', 'card', 'card', 'card', 'mobile']
+
+FIRST_NAMES = ['Ama', 'Kofi', 'Maria', 'John', 'Wei', 'Aisha', 'Carlos', 'Olga', 'Ravi', 'Sara',
+               'Tomas', 'Yuki', 'Amir', 'Lena', 'Musa', 'Ines', 'Pavel', 'Nora', 'Ahmed', 'Grace']
+LAST_NAMES = ['Mensah', 'Silva', 'Smith', 'Chen', 'Khan', 'Garcia', 'Ivanova', 'Patel', 'Berg',
+              'Novak', 'Sato', 'Haddad', 'Fischer', 'Okafor', 'Costa', 'Dubois', 'Mwangi', 'Lee']
+PRODUCT_WORDS = ['Milk', 'Bread', 'Rice', 'Soap', 'Tea', 'Coffee', 'Sugar', 'Oil', 'Beans', 'Juice',
+                 'Flour', 'Salt', 'Eggs', 'Butter', 'Cereal', 'Pasta', 'Tissue', 'Candles', 'Biscuits', 'Water']
+PRODUCT_SIZES = ['Small', 'Medium', 'Large', 'Family', '250g', '500g', '1kg', '1L', '2L', '6-pack']
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def barcode(product_id):
+    return f"{product_id:013d}"
+
+def _chunks(rows, size=CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _users():
+    for i in range(1, CASHIERS + 1):
+        yield (f"cashier{i}", 'cashier123', f"Cashier {i}", 'cashier')
+
+def _products(rng, count):
+    for i in range(1, count + 1):
+        name = f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_SIZES)} #{i}"
+        price = round(rng.uniform(0.25, 60.0) * 100)
+        yield (i, barcode(i), name, price, rng.randint(500, 5000))
+
+def _customers(rng, count):
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        phone = f"+1-555-{rng.randrange(10000000):07d}"
+        email = f"{first.lower()}.{last.lower()}{i}@example.com"
+        yield (i, f"{first} {last}", phone, email, f"{rng.randint(1, 999)} Market Street", phone_key(phone))
+
+def _basket_size(rng):
+    return min(BASKET_MAX, 1 + int(rng.expovariate(1 / (BASKET_MEAN - 1))))
+
+def _pick_product(rng, products):
+    # Skewed popularity: low ids sell far more often than the long tail
+    return 1 + int(products * rng.random() ** 2.5)
+
+def _sales(rng, prices, customers, sale_items, start, span):
+    # Yields (sale row, item rows) in sale_date order, spreading the sales
+    # evenly over the date range so the history grows the way a till's does
+    products = len(prices) - 1
+    written = 0
+    sale_id = 0
+    while written < sale_items:
+        sale_id += 1
+        size = min(_basket_size(rng), sale_items - written, products)
+        chosen = set()
+        while len(chosen) < size:
+            chosen.add(_pick_product(rng, products))
+        items = []
+        total = 0
+        for product_id in chosen:
+            quantity = 1 if rng.random() < 0.8 else rng.randint(2, 6)
+            price = prices[product_id]
+            total += price * quantity
+            items.append((sale_id, product_id, quantity, price))
+        # Cash paid rounded up to the next 5.00 half the time
+        paid = -(-total // 500) * 500 if rng.random() < 0.5 else total
+        offset = span * written / sale_items + rng.uniform(0, span / sale_items)
+        sale_date = (start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+        customer_id = rng.randint(1, customers) if customers and rng.random() < CUSTOMER_SALE_RATE else None
+        sale = (sale_id, customer_id, rng.randint(2, CASHIERS + 1), total, paid,
+                paid - total, rng.choice(PAYMENT_METHODS), sale_date)
+        written += len(items)
+        yield sale, items
+
+def generate(path, products=DEFAULT_PRODUCTS, customers=DEFAULT_CUSTOMERS, sale_items=DEFAULT_SALE_ITEMS,
+             years=DEFAULT_YEARS, seed=1, end_date=DEFAULT_END_DATE, verbose=False):
+    # Build a new database at path. Returns a dict describing what was written.
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    conn = connect(path)
+    try:
+        migrate(conn)
+        # Bulk load without a journal; the file is thrown away if this fails
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA cache_size = -200000')
+
+        with conn:
+            conn.executemany('INSERT INTO users (username, password, full_name, role) VALUES (?, ?, ?, ?)',
+                             _users())
+            for chunk in _chunks(_products(rng, products)):
+                conn.executemany('INSERT INTO products (id, barcode, name, price, stock) VALUES (?, ?, ?, ?, ?)',
+                                 chunk)
+            for chunk in _chunks(_customers(rng, customers)):
+                conn.executemany('''
+                    INSERT INTO customers (id, name, phone, email, address, phone_key) VALUES (?, ?, ?, ?, ?, ?)
+                ''', chunk)
+
+        prices = [0] + [row[0] for row in conn.execute('SELECT price FROM products ORDER BY id')]
+        end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+        start = end - timedelta(days=365 * years)
+        span = (end - start).total_seconds() - 1
+
+        # Sale items are written after their chunk's sales, which would
+        # bump the sales generation once per item
+        conn.execute('INSERT INTO bulk_load DEFAULT VALUES')
+        sales = 0
+        items_written = 0
+        sale_rows = []
+        item_rows = []
+        for sale, items in _sales(rng, prices, customers, sale_items, start, span):
+            sale_rows.append(sale)
+            item_rows.extend(items)
+            if len(item_rows) >= CHUNK_ROWS:
+                _write_sales(conn, sale_rows, item_rows)
+                sales += len(sale_rows)
+                items_written += len(item_rows)
+                sale_rows, item_rows = [], []
+                if verbose:
+                    print(f"\r{items_written:,} / {sale_items:,} sale items", end='', flush=True)
+        _write_sales(conn, sale_rows, item_rows)
+        sales += len(sale_rows)
+        items_written += len(item_rows)
+
+        _derived_tables(conn)
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    if verbose:
+        print(f"\rGenerated {products:,} products, {customers:,} customers, {sales:,} sales and "
+              f"{items_written:,} sale items in {elapsed:.1f} s")
+    return {
+        'products': products,
+        'customers': customers,
+        'sales': sales,
+        'sale_items': items_written,
+        'years': years,
+        'seed': seed,
+        'end_date': end_date,
+        'seconds': elapsed,
+    }
+
+def _write_sales(conn, sale_rows, item_rows):
+    with conn:
+        conn.executemany('''
+            INSERT INTO sales (id, customer_id, user_id, total_amount, amount_paid, change_given, payment_method, sale_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', sale_rows)
+        conn.executemany('INSERT INTO sale_items (sale_id, product_id, quantity, price) VALUES (?, ?, ?, ?)',
+                         item_rows)
+
+def _derived_tables(conn):
+    # Tables the POS keeps up to date as sales are recorded, filled in one
+    # pass here because the history was bulk loaded
+    with conn:
+        conn.execute('DELETE FROM daily_rollup')
+        conn.execute('''
+            INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+            SELECT sale_day, payment_method, COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+            FROM sales
+            GROUP BY sale_day, payment_method
+        ''')
+        # The bulk load is not a change for incremental backups to pick up
+        conn.execute('DELETE FROM change_log')
+        conn.execute('DELETE FROM bulk_load')
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic POS database')
+    parser.add_argument('--db', required=True, help='database file to create')
+    parser.add_argument('--products', type=int, default=DEFAULT_PRODUCTS)
+    parser.add_argument('--customers', type=int, default=DEFAULT_CUSTOMERS)
+    parser.add_argument('--sale-items', type=int, default=DEFAULT_SALE_ITEMS)
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS)
+    parser.add_argument('--end-date', default=DEFAULT_END_DATE, help='last day of sales history (YYYY-MM-DD)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        generate(args.db, args.products, args.customers, args.sale_items, args.years, args.seed,
+                 args.end_date, verbose=True)
+    except FileExistsError:
+        print(f"{args.db} already exists; remove it or choose another path.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pos_db import reader
+
+# Maximum number of cached products (unset = hold the whole catalog)
+PRODUCT_CACHE_SIZE = int(os.environ.get('POS_PRODUCT_CACHE_SIZE', '0')) or None
+# How often a lookup checks for product changes made by other processes
+PRODUCT_CACHE_CHECK_SECONDS = float(os.environ.get('POS_PRODUCT_CACHE_CHECK_S', '2'))
+# Report results kept per lane (0 = no report cache)
+REPORT_CACHE_SIZE = int(os.environ.get('POS_REPORT_CACHE_SIZE', '32'))
+
+
+class ProductCache:
+    # Products keyed by id, with a barcode -> id index so a scan is a dict
+    # lookup. Without max_size the whole catalog is loaded at startup; with
+    # max_size only the most recently used products are kept (LRU) and a
+    # miss falls through to the database.
+    # Writers in this process must keep it coherent via refresh(), remove()
+    # and adjust_stock(). Changes from other tills and the back office are
+    # picked up through products_generation, which lookups check at most
+    # every check_seconds: when it has moved the cache is loaded again. Stock
+    # is not covered (see add_to_cart and finalize in pos_services).
+
+    def __init__(self, max_size=None, check_seconds=PRODUCT_CACHE_CHECK_SECONDS):
+        self.max_size = max_size
+        self.check_seconds = check_seconds
+        self._by_id = OrderedDict()
+        self._by_barcode = {}
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def load(self):
+        # Read the generation first: a change that lands in between is
+        # loaded again on the next check, never missed
+        generation = self._read_generation()
+        with self._lock:
+            self._by_id.clear()
+            self._by_barcode.clear()
+            self._generation = generation
+            self._checked = time.monotonic()
+        if self.max_size:
+            return
+        with reader() as conn:
+            rows = conn.execute('SELECT * FROM products').fetchall()
+        with self._lock:
+            for row in rows:
+                self._store(dict(row))
+
+    def _read_generation(self):
+        try:
+            with reader() as conn:
+                row = conn.execute('SELECT generation FROM products_generation').fetchone()
+        except sqlite3.Error:
+            # Not migrated yet (or mid restore): check again next time
+            return None
+        return row[0] if row else None
+
+    def _check(self):
+        # Reload when another process changed products since the last load
+        now = time.monotonic()
+        with self._lock:
+            if self._checked is not None and now - self._checked < self.check_seconds:
+                return
+            self._checked = now
+            loaded = self._generation
+        generation = self._read_generation()
+        if generation is not None and generation != loaded:
+            if loaded is not None:
+                with self._lock:
+                    self.reloads += 1
+            self.load()
+
+    def _store(self, product):
+        old = self._by_id.pop(product['id'], None)
+        if old is not None and old['barcode'] is not None:
+            self._by_barcode.pop(old['barcode'], None)
+        self._by_id[product['id']] = product
+        if product['barcode'] is not None:
+            self._by_barcode[product['barcode']] = product['id']
+        if self.max_size:
+            while len(self._by_id) > self.max_size:
+                _, evicted = self._by_id.popitem(last=False)
+                if evicted['barcode'] is not None:
+                    self._by_barcode.pop(evicted['barcode'], None)
+                self.evictions += 1
+
+    def _lookup(self, column, value):
+        with reader() as conn:
+            row = conn.execute(f'SELECT * FROM products WHERE {column} = ?', (value,)).fetchone()
+        if row is None:
+            return None
+        product = dict(row)
+        with self._lock:
+            self._store(product)
+        return product
+
+    def get_by_barcode(self, barcode):
+        self._check()
+        with self._lock:
+            product_id = self._by_barcode.get(barcode)
+            if product_id is not None:
+                self.hits += 1
+                self._by_id.move_to_end(product_id)
+                return self._by_id[product_id]
+            self.misses += 1
+        return self._lookup('barcode', barcode)
+
+    def get_by_id(self, product_id):
+        self._check()
+        with self._lock:
+            product = self._by_id.get(product_id)
+            if product is not None:
+                self.hits += 1
+                self._by_id.move_to_end(product_id)
+                return product
+            self.misses += 1
+        return self._lookup('id', product_id)
+
+    def refresh(self, product_id):
+        # Re-read one product after it was inserted or updated
+        self.remove(product_id)
+        return self._lookup('id', product_id)
+
+    def remove(self, product_id):
+        with self._lock:
+            old = self._by_id.pop(product_id, None)
+            if old is not None and old['barcode'] is not None:
+                self._by_barcode.pop(old['barcode'], None)
+
+    def adjust_stock(self, product_id, delta):
+        with self._lock:
+            product = self._by_id.get(product_id)
+            if product is not None:
+                self._by_id[product_id] = dict(product, stock=product['stock'] + delta)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._by_id),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reloads': self.reloads,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+product_cache = ProductCache(PRODUCT_CACHE_SIZE)
+
+
+class ReportCache:
+    # Report results keyed by (report, range), each stored with the sales
+    # generation and highest sale id it was computed at (see the report
+    # cache in pos_services). The least recently used results are dropped
+    # past max_size.
+
+    def __init__(self, max_size=REPORT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.folds = 0
+        self.misses = 0
+
+    def get(self, key):
+        # (generation, high_water, result) or None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, generation, high_water, result):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._entries[key] = (generation, high_water, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def count(self, outcome):
+        # outcome is 'hits', 'folds' or 'misses'
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            runs = self.hits + self.folds + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'folds': self.folds,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.folds) / runs if runs else 0.0,
+            }
+
+
+report_cache = ReportCache(REPORT_CACHE_SIZE)
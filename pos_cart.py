@@ -0,0 +1,85 @@
+import time
+from pos_money import Money
+
+
+class CartLine:
+    # price is Money (the product's price in cents when it was scanned)
+    __slots__ = ('product_id', 'name', 'price', 'quantity')
+
+    def __init__(self, product_id, name, price, quantity):
+        self.product_id = product_id
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    @property
+    def subtotal(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    # Lines keyed by product id (dicts keep insertion order for display),
+    # with the total and item count kept up to date on every add/remove so
+    # scanning and redrawing stay O(1) per item regardless of basket size.
+    # Money is in whole cents, so the running total never drifts.
+    # user_id labels the lane's scan metrics; started is the perf_counter
+    # time of the basket's first scan.
+
+    def __init__(self, user_id=None):
+        self._lines = {}
+        self.user_id = user_id
+        self.customer_id = None
+        self.total = Money()
+        self.item_count = 0
+        self.started = None
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __contains__(self, product_id):
+        return product_id in self._lines
+
+    def quantity_of(self, product_id):
+        line = self._lines.get(product_id)
+        return line.quantity if line else 0
+
+    def add(self, product, quantity=1):
+        if self.started is None:
+            self.started = time.perf_counter()
+        line = self._lines.get(product['id'])
+        if line is None:
+            line = self._lines[product['id']] = CartLine(product['id'], product['name'], Money(product['price']), 0)
+        line.quantity += quantity
+        self.total += line.price * quantity
+        self.item_count += quantity
+        return line
+
+    def remove(self, product_id, quantity):
+        line = self._lines[product_id]
+        quantity = min(quantity, line.quantity)
+        line.quantity -= quantity
+        self.total -= line.price * quantity
+        self.item_count -= quantity
+        if line.quantity <= 0:
+            del self._lines[product_id]
+        return quantity
+
+    def line_at(self, position):
+        # 1-based position in display order
+        for index, line in enumerate(self._lines.values(), 1):
+            if index == position:
+                return line
+        return None
+
+    def clear(self):
+        self._lines.clear()
+        self.customer_id = None
+        self.total = Money()
+        self.item_count = 0
+        self.started = None
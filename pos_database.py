@@ -1,80 +1,325 @@
--- Users table (for authentication and authorization)
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL UNIQUE,
-    password TEXT NOT NULL,
-    full_name TEXT NOT NULL,
-    role TEXT NOT NULL DEFAULT 'cashier',  -- 'admin' or 'cashier'
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
--- Products table
-CREATE TABLE IF NOT EXISTS products (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    barcode TEXT UNIQUE,
-    name TEXT NOT NULL,
-    price REAL NOT NULL,
-    stock INTEGER NOT NULL DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP
-);
-
--- Customers table
-CREATE TABLE IF NOT EXISTS customers (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    phone TEXT,
-    email TEXT,
-    address TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP
-);
-
--- Sales table (header information)
-CREATE TABLE IF NOT EXISTS sales (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    customer_id INTEGER,
-    user_id INTEGER NOT NULL,
-    total_amount REAL NOT NULL,
-    amount_paid REAL NOT NULL,
-    change_given REAL NOT NULL,
-    payment_method TEXT NOT NULL,  -- 'cash' or 'card'
-    sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE SET NULL,
-    FOREIGN KEY (user_id) REFERENCES users(id)
-);
-
--- Sale items table (line items for each sale)
-CREATE TABLE IF NOT EXISTS sale_items (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    sale_id INTEGER NOT NULL,
-    product_id INTEGER NOT NULL,
-    quantity INTEGER NOT NULL,
-    price REAL NOT NULL,
-    FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE CASCADE,
-    FOREIGN KEY (product_id) REFERENCES products(id)
-);
-
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_products_barcode ON products(barcode);
-CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date);
-CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id);
-CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id);
-
--- Insert default admin user
-INSERT OR IGNORE INTO users (username, password, full_name, role) 
-VALUES ('admin', 'admin123', 'System Administrator', 'admin');
-
--- Sample products (optional)
-INSERT OR IGNORE INTO products (barcode, name, price, stock) VALUES
-('123456789', 'Premium Coffee', 4.99, 100),
-('987654321', 'Organic Tea', 3.49, 75),
-('456123789', 'Chocolate Bar', 1.99, 200),
-('789123456', 'Bottled Water', 0.99, 150),
-('321654987', 'Energy Drink', 2.49, 50);
-
--- Sample customers (optional)
-INSERT OR IGNORE INTO customers (name, phone, email, address) VALUES
-('John Smith', '555-123-4567', 'john@example.com', '123 Main St'),
-('Sarah Johnson', '555-987-6543', 'sarah@example.com', '456 Oak Ave'),
-('Mike Williams', '555-456-7890', 'mike@example.com', '789 Pine Rd');
+-- Users table (for authentication and authorization)
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'cashier',  -- 'admin' or 'cashier'
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Products table (money columns here and below are whole cents, see pos_money.py)
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    barcode TEXT UNIQUE,
+    name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    stock INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Customers table
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP,
+    phone_key TEXT  -- phone digits reversed, for search by the last digits
+);
+
+-- Sales table (header information)
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER,
+    user_id INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    amount_paid INTEGER NOT NULL,
+    change_given INTEGER NOT NULL,
+    payment_method TEXT NOT NULL,  -- 'cash' or 'card'
+    sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Integer time buckets for range scans, computed from sale_date
+    sale_epoch INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', sale_date) AS INTEGER)) VIRTUAL,
+    sale_day INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y%m%d', sale_date) AS INTEGER)) VIRTUAL,
+    sale_month INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y%m', sale_date) AS INTEGER)) VIRTUAL,
+    journal_key TEXT,  -- set for sales written from a till's sales journal
+    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE SET NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+-- Sale items table (line items for each sale)
+CREATE TABLE IF NOT EXISTS sale_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sale_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Daily sales totals per payment method, maintained by pos_services when sales
+-- are recorded or deleted (rebuild with: python pos_admin.py rebuild-rollup)
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    day INTEGER NOT NULL,  -- YYYYMMDD
+    payment_method TEXT NOT NULL,
+    sale_count INTEGER NOT NULL,
+    revenue INTEGER NOT NULL,
+    min_sale INTEGER NOT NULL,
+    max_sale INTEGER NOT NULL,
+    PRIMARY KEY (day, payment_method)
+) WITHOUT ROWID;
+
+-- Settings shared by every till, read at runtime (see pos_db for sql_trace
+-- and slow_query_ms)
+CREATE TABLE IF NOT EXISTS system_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO system_settings (key, value) VALUES ('sql_trace', '0'), ('slow_query_ms', '100');
+
+-- Full text search over product name and barcode, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, barcode, content='products', content_rowid='id', prefix='2 3'
+);
+
+-- Present only inside a bulk load transaction (pos_transfer), which indexes
+-- its rows for search in one pass instead of through the triggers below
+CREATE TABLE IF NOT EXISTS bulk_load (
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, barcode ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+    INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+END;
+
+-- Full text search over customer names
+CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+    name, content='customers', content_rowid='id', prefix='1 2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts (rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO customers_fts (rowid, name) VALUES (new.id, new.name);
+END;
+
+-- Row changes for incremental backups (pos_backup): one entry per insert,
+-- update or delete on the tracked tables, pruned after each backup. Nothing
+-- is logged until a backup chain is started (a row in backup_state).
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS backup_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    chain TEXT NOT NULL,
+    last_seq INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS users_log_insert AFTER INSERT ON users
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('users', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_log_update AFTER UPDATE ON users
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('users', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_log_delete AFTER DELETE ON users
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('users', old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_log_insert AFTER INSERT ON customers
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('customers', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_log_update AFTER UPDATE ON customers
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('customers', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_log_delete AFTER DELETE ON customers
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('customers', old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_log_insert AFTER INSERT ON products
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('products', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_log_update AFTER UPDATE ON products
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('products', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_log_delete AFTER DELETE ON products
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('products', old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_log_insert AFTER INSERT ON sales
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sales', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_log_update AFTER UPDATE ON sales
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sales', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_log_delete AFTER DELETE ON sales
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sales', old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_log_insert AFTER INSERT ON sale_items
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sale_items', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_log_update AFTER UPDATE ON sale_items
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sale_items', new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_log_delete AFTER DELETE ON sale_items
+WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('sale_items', old.id);
+END;
+
+-- Sales generation for cached reports (pos_services): bumped when a recorded
+-- sale or sale line changes or is deleted, or a sale is inserted below the
+-- highest id; bulk loads (bulk_load) pause the triggers and bump it once
+CREATE TABLE IF NOT EXISTS sales_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO sales_generation (id, generation) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS sales_generation_insert AFTER INSERT ON sales
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) AND EXISTS (SELECT 1 FROM sales WHERE id > new.id) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_generation_update AFTER UPDATE ON sales
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_generation_delete AFTER DELETE ON sales
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_generation_insert AFTER INSERT ON sale_items
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) AND EXISTS (SELECT 1 FROM sales WHERE id > new.sale_id) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_generation_update AFTER UPDATE ON sale_items
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sale_items_generation_delete AFTER DELETE ON sale_items
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_generation_rename AFTER UPDATE OF name ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE sales_generation SET generation = generation + 1;
+END;
+
+-- Products generation for the tills' product caches (pos_cache): bumped when a
+-- product is added, removed, renamed, re-barcoded or repriced (not on stock
+-- changes); bulk loads pause the triggers and bump it once
+CREATE TABLE IF NOT EXISTS products_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO products_generation (id, generation) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS products_generation_insert AFTER INSERT ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE products_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_generation_update AFTER UPDATE OF barcode, name, price ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE products_generation SET generation = generation + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_generation_delete AFTER DELETE ON products
+WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+    UPDATE products_generation SET generation = generation + 1;
+END;
+
+-- Create indexes for better performance (applied to existing databases by pos_migrations.py)
+-- products.barcode is already indexed by its UNIQUE constraint
+CREATE INDEX IF NOT EXISTS idx_sales_day ON sales(sale_day, payment_method, total_amount);
+CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id);
+CREATE INDEX IF NOT EXISTS idx_sales_user_id ON sales(user_id);
+CREATE INDEX IF NOT EXISTS idx_sales_epoch ON sales(sale_epoch, id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_journal_key ON sales(journal_key) WHERE journal_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_customers_phone_key ON customers(phone_key);
+CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id, product_id, quantity, price);
+CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id);
+
+-- Insert default admin user
+INSERT OR IGNORE INTO users (username, password, full_name, role) 
+VALUES ('admin', 'admin123', 'System Administrator', 'admin');
+
+-- Sample products (optional), prices in cents
+INSERT OR IGNORE INTO products (barcode, name, price, stock) VALUES
+('123456789', 'Premium Coffee', 499, 100),
+('987654321', 'Organic Tea', 349, 75),
+('456123789', 'Chocolate Bar', 199, 200),
+('789123456', 'Bottled Water', 99, 150),
+('321654987', 'Energy Drink', 249, 50);
+
+-- Sample customers (optional)
+INSERT OR IGNORE INTO customers (name, phone, email, address, phone_key) VALUES
+('John Smith', '555-123-4567', 'john@example.com', '123 Main St', '7654321555'),
+('Sarah Johnson', '555-987-6543', 'sarah@example.com', '456 Oak Ave', '3456789555'),
+('Mike Williams', '555-456-7890', 'mike@example.com', '789 Pine Rd', '0987654555');
+
+-- Schema version: the latest migration in pos_migrations.py this script already
+-- includes. Bump it together with every new migration, or migrate() re-runs the
+-- newer migrations against tables that already have their changes.
+PRAGMA user_version = 16;
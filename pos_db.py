@@ -0,0 +1,429 @@
+import os
+import pathlib
+import random
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+# Database location (override with POS_DB_PATH for other tills / tools)
+DB_PATH = os.environ.get('POS_DB_PATH', 'pos_database.db')
+
+# Lane (till) name, used to label contention counters
+LANE = os.environ.get('POS_LANE', '1')
+
+# Connection tuning, applied once when a connection is opened
+BUSY_TIMEOUT_MS = int(os.environ.get('POS_BUSY_TIMEOUT_MS', '5000'))
+CACHE_SIZE_KB = 16000
+READ_POOL_SIZE = 4
+
+# Retry policy for write transactions that still hit SQLITE_BUSY after the
+# busy timeout (several lanes sharing one database file)
+WRITE_RETRIES = int(os.environ.get('POS_WRITE_RETRIES', '5'))
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 2.0
+# Waits for the write lock longer than this count as a lock wait
+LOCK_WAIT_THRESHOLD = 0.001
+
+# SQL tracing is switched on and off for every till from system_settings
+# (sql_trace, slow_query_ms); each process re-reads the settings at most
+# this often. Slow statements are appended to SLOW_QUERY_LOG.
+TRACE_REFRESH_SECONDS = 5.0
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = os.environ.get('POS_SLOW_QUERY_LOG', 'pos_slow_queries.log')
+# Upper bounds of the statement latency histogram buckets
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def read_only_uri(path):
+    return pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro'
+
+
+class ConnectionPool:
+    # One long-lived writer connection plus a small pool of read connections.
+    # Writers are serialized with a lock; readers are checked out exclusively
+    # and returned to the pool when the with-block ends. Once closed the
+    # pool hands out nothing, and readers still checked out are closed when
+    # they come back.
+
+    def __init__(self, path=DB_PATH, readers=READ_POOL_SIZE):
+        self.path = path
+        self.max_readers = readers
+        self._closed = False
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(readers)
+
+    def _connect(self, readonly=False):
+        # Read connections open the file read-only (mode=ro): they can read
+        # the WAL but never write, checkpoint or take a write lock
+        target = read_only_uri(self.path) if readonly else self.path
+        try:
+            conn = sqlite3.connect(target, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                   factory=TracingConnection, uri=readonly)
+        except sqlite3.Error as e:
+            print(f"Database connection error: {e}")
+            sys.exit(1)
+        conn.row_factory = sqlite3.Row
+        if not readonly:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+        return conn
+
+    def _writer_connection(self):
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError('Cannot use a closed connection pool')
+            if self._writer is None:
+                self._writer = self._connect()
+            return self._writer
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            conn = self._writer_connection()
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    @contextmanager
+    def reader(self):
+        # The writer switches the file to WAL, so open it before any reader
+        # (checked first so a reader never waits on a running write)
+        if self._writer is None:
+            self._writer_connection()
+        self._slots.acquire()
+        try:
+            with self._idle_lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError('Cannot use a closed connection pool')
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect(readonly=True)
+            try:
+                yield conn
+            finally:
+                with self._idle_lock:
+                    closed = self._closed
+                    if not closed:
+                        if conn.in_transaction:
+                            conn.rollback()
+                        self._idle.append(conn)
+                if closed:
+                    conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._write_lock:
+            with self._idle_lock:
+                self._closed = True
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            with self._idle_lock:
+                for conn in self._idle:
+                    conn.close()
+                self._idle = []
+
+
+class ContentionStats:
+    # Lock wait and retry counters for this lane
+
+    def __init__(self, lane):
+        self.lane = lane
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.lock_waits = 0
+            self.lock_wait_seconds = 0.0
+            self.max_lock_wait = 0.0
+            self.retries = 0
+            self.failures = 0
+
+    def record_begin(self, waited):
+        with self._lock:
+            self.transactions += 1
+            if waited >= LOCK_WAIT_THRESHOLD:
+                self.lock_waits += 1
+                self.lock_wait_seconds += waited
+                self.max_lock_wait = max(self.max_lock_wait, waited)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'lane': self.lane,
+                'transactions': self.transactions,
+                'lock_waits': self.lock_waits,
+                'lock_wait_seconds': self.lock_wait_seconds,
+                'max_lock_wait': self.max_lock_wait,
+                'retries': self.retries,
+                'failures': self.failures,
+            }
+
+
+class QueryStats:
+    # Per-statement counts and latency histograms for this lane while SQL
+    # tracing is on, plus the slow query log. Statements are keyed by their
+    # SQL text with whitespace collapsed; parameters are not part of the key.
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.enabled = False
+        self.slow_ms = SLOW_QUERY_MS
+        self._checked = None
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+
+    def active(self, conn):
+        # Whether to time this statement; re-reads the settings when they
+        # are due and keeps the connection's trace callback in step
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= TRACE_REFRESH_SECONDS:
+            self._checked = now
+            self.refresh(conn)
+        if conn.traced != self.enabled:
+            conn.set_trace_callback(self._traced if self.enabled else None)
+            conn.traced = self.enabled
+        return self.enabled
+
+    def refresh(self, conn):
+        try:
+            settings = dict(sqlite3.Connection.execute(
+                conn, "SELECT key, value FROM system_settings WHERE key IN ('sql_trace', 'slow_query_ms')"))
+        except sqlite3.Error:
+            # Not migrated yet (or mid restore): keep the current state
+            return
+        self.enabled = settings.get('sql_trace') == '1'
+        try:
+            self.slow_ms = float(settings.get('slow_query_ms', SLOW_QUERY_MS))
+        except ValueError:
+            self.slow_ms = SLOW_QUERY_MS
+
+    def expire(self):
+        # Re-read the settings on the next statement (after changing them)
+        self._checked = None
+
+    def _traced(self, statement):
+        # sqlite3 trace callback: the statement as SQLite runs it, with the
+        # parameters bound in. Transactions opened implicitly by the sqlite3
+        # module never pass through execute(), so they are counted here.
+        if statement == 'BEGIN ':
+            self._add('BEGIN (implicit)', 0.0)
+        else:
+            self._local.expanded = statement
+
+    def record(self, conn, sql, parameters, seconds, many=False):
+        key = ' '.join(sql.split())
+        self._add(key, seconds)
+        if seconds * 1000 >= self.slow_ms:
+            expanded = getattr(self._local, 'expanded', None)
+            self._log_slow(conn, key, parameters, seconds, expanded, many)
+        self._local.expanded = None
+
+    def _add(self, key, seconds):
+        bucket = bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            stat = self._statements.get(key)
+            if stat is None:
+                stat = self._statements[key] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS_MS) + 1)]
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            stat[3][bucket] += 1
+
+    def _plan(self, conn, sql, parameters):
+        if sql.split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE'):
+            return []
+        try:
+            rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except (sqlite3.Error, ValueError):
+            return []
+        return [row[3] for row in rows]
+
+    def _log_slow(self, conn, sql, parameters, seconds, expanded, many):
+        if many:
+            # executemany: plan the statement with its first row, if we have it
+            parameters = parameters[0] if isinstance(parameters, (list, tuple)) and parameters else None
+        plan = self._plan(conn, sql, parameters) if parameters is not None else []
+        lines = [f"{datetime.now().isoformat(sep=' ', timespec='milliseconds')} lane {self.lane} "
+                 f"{seconds * 1000:.1f} ms{' (executemany)' if many else ''}",
+                 f"  SQL: {sql}"]
+        if parameters:
+            lines.append(f"  Parameters: {parameters!r:.500}")
+        if expanded and expanded != sql:
+            lines.append(f"  Bound: {' '.join(expanded.split()):.1000}")
+        lines.extend(f"  Plan: {step}" for step in plan)
+        try:
+            with self._log_lock, open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError:
+            pass
+
+    def snapshot(self):
+        # Statements by total time, with count, mean, p95 (bucket bound),
+        # max and the histogram counts
+        with self._lock:
+            stats = [(key, stat[0], stat[1], stat[2], list(stat[3])) for key, stat in self._statements.items()]
+        result = []
+        for sql, count, total, longest, buckets in sorted(stats, key=lambda s: -s[2]):
+            result.append({
+                'sql': sql,
+                'count': count,
+                'total_seconds': total,
+                'mean_ms': total * 1000 / count,
+                'p95_ms': _bucket_quantile(buckets, 0.95, longest * 1000),
+                'max_ms': longest * 1000,
+                'buckets': buckets,
+            })
+        return result
+
+
+def _bucket_quantile(buckets, quantile, longest_ms):
+    # Upper bound of the bucket holding the quantile (the longest statement
+    # for the open-ended last bucket)
+    wanted = quantile * sum(buckets)
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= wanted:
+            return min(bound, longest_ms)
+    return longest_ms
+
+
+class TracingConnection(sqlite3.Connection):
+    # Pool connections time execute(), executemany(), executescript() and
+    # commit() into query_stats while tracing is on. With tracing off the
+    # cost is a clock read and a flag check per statement. The time is what
+    # the call takes: the whole statement for writes, up to the first row
+    # for queries (later fetches are not counted).
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.traced = False
+
+    def execute(self, sql, parameters=()):
+        if not query_stats.active(self):
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            query_stats.record(self, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        if not query_stats.active(self):
+            return super().executemany(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            query_stats.record(self, sql, parameters, time.perf_counter() - start, many=True)
+
+    def executescript(self, script):
+        if not query_stats.active(self):
+            return super().executescript(script)
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            query_stats.record(self, script, None, time.perf_counter() - start)
+
+    def commit(self):
+        if not self.in_transaction or not query_stats.active(self):
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            query_stats.record(self, 'COMMIT', None, time.perf_counter() - start)
+
+
+contention = ContentionStats(LANE)
+query_stats = QueryStats(LANE)
+
+def begin_immediate(conn):
+    # Take the write lock up front so a read-then-write transaction cannot
+    # fail half way with SQLITE_BUSY; time spent waiting is counted per lane
+    # and returned
+    start = time.perf_counter()
+    conn.execute('BEGIN IMMEDIATE')
+    waited = time.perf_counter() - start
+    contention.record_begin(waited)
+    return waited
+
+def is_busy_error(error):
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    name = getattr(error, 'sqlite_errorname', '')
+    return name.startswith(('SQLITE_BUSY', 'SQLITE_LOCKED')) or 'locked' in str(error) or 'busy' in str(error)
+
+def with_retry(func, *args, **kwargs):
+    # Run a whole write transaction, retrying with jittered exponential
+    # backoff if another lane keeps the database locked
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == WRITE_RETRIES:
+                if is_busy_error(e):
+                    contention.record_failure()
+                raise
+            contention.record_retry()
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(random.uniform(delay / 2, delay))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def reader():
+    return get_pool().reader()
+
+def writer():
+    return get_pool().writer()
+
+def close_pool():
+    # Close every pooled connection (before replacing the database file, at
+    # exit); the next reader() or writer() starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,292 @@
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+# Write-ahead journal for completed sales. finalize appends the sale to a
+# local append-only file and fsyncs it, and the customer can go; a
+# background thread drains the journal into the database in batches, each
+# batch one transaction. Appends that arrive while another thread is
+# fsyncing share the next fsync (group fsync).
+#
+# Each record is a 4-byte payload length, the payload's CRC-32 and the
+# JSON payload. The offset up to which records are in the database is kept
+# in PATH.applied. A crash can leave a torn record at the end of the file:
+# it was never fsynced, so no customer was told the sale went through, and
+# it is cut off when the journal is opened. The function that applies
+# records must be idempotent (sales carry their journal key), because a
+# crash between a batch's commit and the checkpoint replays that batch.
+
+# Journal file for this till; unset keeps the synchronous finalize
+JOURNAL_PATH = os.environ.get('POS_SALES_JOURNAL')
+JOURNAL_BATCH = 200
+# How long the drain thread sleeps when there is nothing to apply
+JOURNAL_IDLE_SECONDS = 1.0
+# Back-off after a failed batch (database locked for longer than the
+# retries, disk full...)
+JOURNAL_RETRY_SECONDS = 2.0
+
+_HEADER = struct.Struct('<II')
+
+
+class JournalError(Exception):
+    pass
+
+
+class SalesJournal:
+
+    def __init__(self, path, apply, batch=JOURNAL_BATCH):
+        # apply(entries) writes a list of entries in one transaction and
+        # raises sqlite3.IntegrityError if one of them cannot be written
+        self.path = path
+        self.checkpoint_path = path + '.applied'
+        self.rejects_path = path + '.rejected'
+        self.apply = apply
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._synced_cond = threading.Condition(threading.Lock())
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._drain_lock = threading.Lock()
+        self.appended = 0
+        self.applied_entries = 0
+        self.fsyncs = 0
+        self.rejected = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._applied = self._read_checkpoint()
+        self._written = self._recover()
+        self._synced = self._written
+        self._syncing = False
+        self._file = open(path, 'ab', buffering=0)
+
+    # Opening
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(json.load(f)['offset'])
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError, TypeError):
+            raise JournalError(f"Unreadable journal checkpoint {self.checkpoint_path}")
+
+    def _write_checkpoint(self, offset):
+        # Durable once this returns: the new file's contents and the rename
+        # are both on disk, so a power cut cannot bring back an old offset
+        temp = self.checkpoint_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'offset': offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.checkpoint_path)
+        _fsync_directory(self.checkpoint_path)
+
+    def _recover(self):
+        # Check every record not yet applied and cut the file at the first
+        # torn or corrupt one. Returns the end of the valid records.
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+            _fsync_directory(self.path)
+        size = os.path.getsize(self.path)
+        if self._applied > size:
+            # The file was emptied after a full drain but the checkpoint
+            # was not reset before a crash
+            self._applied = 0
+            self._write_checkpoint(0)
+        end = self._applied
+        with open(self.path, 'rb') as f:
+            f.seek(end)
+            for _, offset in _records(f):
+                end = offset
+        if end < size:
+            # Keep the damaged tail for inspection before cutting it off
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            shutil.copyfile(self.path, f"{self.path}.damaged-{stamp}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+            print(f"Sales journal {self.path}: dropped {size - end} bytes of an unfinished write")
+        return end
+
+    # Appending
+
+    def append(self, entry):
+        # Returns once the entry is on disk
+        payload = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._file.write(record)
+            self._written += len(record)
+            end = self._written
+            self.appended += 1
+        self._sync(end)
+        self._wake.set()
+
+    def _sync(self, end):
+        # Group fsync: one thread fsyncs on behalf of everything written
+        # so far while the others wait for it
+        with self._synced_cond:
+            while self._synced < end:
+                if self._syncing:
+                    self._synced_cond.wait()
+                    continue
+                self._syncing = True
+                # Everything written before this point is covered
+                target = self._written
+                self._synced_cond.release()
+                try:
+                    os.fsync(self._file.fileno())
+                finally:
+                    self._synced_cond.acquire()
+                    self._syncing = False
+                self._synced = max(self._synced, target)
+                self.fsyncs += 1
+                self._synced_cond.notify_all()
+
+    # Draining
+
+    def pending(self):
+        # Bytes on disk not yet in the database
+        with self._synced_cond:
+            return self._synced - self._applied
+
+    def drain(self):
+        # Apply everything fsynced so far. Returns the number of entries
+        # applied; database errors are raised after the failing batch.
+        with self._drain_lock:
+            count = 0
+            with self._synced_cond:
+                end = self._synced
+            with open(self.path, 'rb') as f:
+                f.seek(self._applied)
+                entries = []
+                for entry, offset in _records(f, end):
+                    entries.append(entry)
+                    if len(entries) >= self.batch:
+                        count += self._apply(entries, offset)
+                        entries = []
+                if entries:
+                    count += self._apply(entries, offset)
+            self._compact()
+            return count
+
+    def _apply(self, entries, offset):
+        try:
+            self.apply(entries)
+        except sqlite3.IntegrityError:
+            # One entry cannot be written (a product deleted meanwhile...):
+            # apply them one at a time and set the bad ones aside
+            for entry in entries:
+                try:
+                    self.apply([entry])
+                except sqlite3.IntegrityError as e:
+                    self._reject(entry, e)
+        self._applied = offset
+        self._write_checkpoint(offset)
+        self.applied_entries += len(entries)
+        return len(entries)
+
+    def _reject(self, entry, error):
+        self.rejected += 1
+        with open(self.rejects_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'error': str(error), 'entry': entry}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        # Once everything is applied start the file over, so it only ever
+        # holds the sales of the last few moments. The checkpoint goes back
+        # to 0 first: a crash before the truncate then only replays sales
+        # already recorded (skipped by their journal keys), whereas a
+        # truncated file with the old offset still in the checkpoint would
+        # make the next open skip over new records.
+        with self._lock, self._synced_cond:
+            if self._syncing or self._applied != self._written or self._written == 0:
+                return
+            self._write_checkpoint(0)
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            self._written = self._synced = self._applied = 0
+
+    # Background writer
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='pos-sales-journal', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(JOURNAL_IDLE_SECONDS)
+            self._wake.clear()
+            try:
+                self.drain()
+                self.last_error = None
+            except Exception as e:
+                # Entries stay in the journal and are tried again
+                self.failures += 1
+                self.last_error = e
+                self._stop.wait(JOURNAL_RETRY_SECONDS)
+
+    def close(self):
+        # Stop the background writer and apply what is left
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.drain()
+        finally:
+            self._file.close()
+
+    def stats(self):
+        return {
+            'appended': self.appended,
+            'applied': self.applied_entries,
+            'pending_bytes': self.pending(),
+            'fsyncs': self.fsyncs,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'last_error': str(self.last_error) if self.last_error else None,
+        }
+
+
+def _fsync_directory(path):
+    # Make a file created or renamed in path's directory survive a power
+    # cut (directories cannot be opened for fsync on Windows)
+    if os.name == 'nt':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _records(f, end=None):
+    # Yield (entry, offset after it) for each intact record from the
+    # current position, stopping at end or at the first bad record
+    offset = f.tell()
+    while end is None or offset < end:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        length, checksum = _HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+        try:
+            entry = json.loads(payload)
+        except ValueError:
+            return
+        offset += _HEADER.size + length
+        yield entry, offset
@@ -0,0 +1,127 @@
+import atexit
+import os
+import threading
+from bisect import bisect_left
+from pos_db import LANE
+
+# Checkout latency metrics for this lane, exported in the Prometheus text
+# format. Each metric is a histogram with fixed buckets, labeled by lane and
+# user id, so recording a value is a bisect and three additions under a
+# lock. The POS writes them to POS_METRICS_FILE every METRICS_INTERVAL
+# seconds (point the node_exporter textfile collector at its directory);
+# without POS_METRICS_FILE nothing is written.
+
+METRICS_FILE = os.environ.get('POS_METRICS_FILE')
+METRICS_INTERVAL = float(os.environ.get('POS_METRICS_INTERVAL', '15'))
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, user_id=None):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is None:
+                series = self._series[user_id] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def render(self):
+        with self._lock:
+            series = [(user_id, list(counts), total) for user_id, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for user_id, counts, total in sorted(series, key=lambda s: str(s[0])):
+            labels = f'lane="{_label(LANE)}",user="{_label("" if user_id is None else user_id)}"'
+            seen = 0
+            for bound, count in zip(self.buckets, counts):
+                seen += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {seen}')
+            seen += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {seen}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {seen}')
+        return lines
+
+
+scan_lookup = Histogram(
+    'pos_scan_lookup_seconds', 'Product lookup time per scan or manual entry.',
+    (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+checkout = Histogram(
+    'pos_checkout_seconds', 'Time from the first scan of a basket to its sale being recorded.',
+    (5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600))
+finalize_commit = Histogram(
+    'pos_finalize_commit_seconds', 'Time to record a sale in the database, retries included.',
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+basket_items = Histogram(
+    'pos_basket_items', 'Items per recorded sale.',
+    (1, 2, 3, 5, 10, 15, 20, 30, 50, 100))
+lock_wait = Histogram(
+    'pos_lock_wait_seconds', 'Wait for the database write lock when recording a sale.',
+    (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5))
+
+HISTOGRAMS = (scan_lookup, checkout, finalize_commit, basket_items, lock_wait)
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+def write(path=None):
+    # Replace the file in one step so the collector never reads half of it
+    path = path or METRICS_FILE
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(temp, path)
+
+
+_writer = None
+_stop = threading.Event()
+
+def _write_loop(path, interval):
+    while not _stop.wait(interval):
+        try:
+            write(path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+
+def start(path=None, interval=METRICS_INTERVAL):
+    # Write the metrics file in the background until exit (no-op without a
+    # metrics file)
+    global _writer
+    path = path or METRICS_FILE
+    if not path or _writer is not None:
+        return
+    _writer = threading.Thread(target=_write_loop, args=(path, interval), name='pos-metrics', daemon=True)
+    _writer.start()
+    atexit.register(stop, path)
+
+def stop(path=None):
+    global _writer
+    if _writer is None:
+        return
+    _stop.set()
+    _writer.join()
+    _writer = None
+    _stop.clear()
+    try:
+        write(path)
+    except OSError:
+        pass
@@ -0,0 +1,668 @@
+import argparse
+import re
+import sys
+import time
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each migration runs in its own IMMEDIATE transaction, so several tills
+# starting at once against the same file apply it exactly once. Timings are
+# recorded in schema_migrations.
+#
+# Run headless at deploy time with: python pos_migrations.py [--db PATH]
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'cashier',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            barcode TEXT UNIQUE,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            stock INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            user_id INTEGER NOT NULL,
+            total_amount REAL NOT NULL,
+            amount_paid REAL NOT NULL,
+            change_given REAL NOT NULL,
+            payment_method TEXT NOT NULL,
+            sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sale_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            FOREIGN KEY (sale_id) REFERENCES sales(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''')
+
+    # Default admin user for a brand new database
+    if conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 0:
+        conn.execute('''
+            INSERT INTO users (username, password, full_name, role)
+            VALUES (?, ?, ?, ?)
+        ''', ('admin', 'admin123', 'System Administrator', 'admin'))
+
+def _indexes(conn):
+    # The sales indexes cover the report and history queries (date range plus
+    # total), and the sale_items index covers per-sale lookups and the
+    # product sales join without touching the table.
+    # products.barcode already has the UNIQUE autoindex.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date, total_amount)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_user_id ON sales(user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id, product_id, quantity, price)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id)')
+
+def _has_column(conn, table, column):
+    # Databases created from pos_database.py may already have newer columns
+    # (table_xinfo also lists generated columns)
+    return any(row['name'] == column for row in conn.execute(f'PRAGMA table_xinfo({table})'))
+
+def _column_type(conn, table, column):
+    for row in conn.execute(f'PRAGMA table_info({table})'):
+        if row['name'] == column:
+            return row['type'].upper()
+    return None
+
+def _rebuild_table(conn, table, create_sql, indexes, convert=None):
+    # SQLite cannot alter a foreign key or column type in place: copy into a
+    # new table and swap it in, keeping the AUTOINCREMENT counter. convert
+    # maps column names to the SQL expression that fills them. Triggers on
+    # the table are dropped with it; the caller recreates them.
+    names = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    columns = ', '.join(names)
+    values = ', '.join((convert or {}).get(name, name) for name in names)
+    seq = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    conn.execute(create_sql.replace(f'CREATE TABLE {table} ', f'CREATE TABLE {table}_new '))
+    conn.execute(f'INSERT INTO {table}_new ({columns}) SELECT {values} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    if seq is not None:
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (seq['seq'], table))
+    for index_sql in indexes:
+        conn.execute(index_sql)
+
+def _on_delete(conn, table, parent):
+    for row in conn.execute(f'PRAGMA foreign_key_list({table})'):
+        if row['table'] == parent:
+            return row['on_delete']
+    return None
+
+def _on_delete_rules(conn):
+    # Match the ON DELETE behaviour declared in pos_database.py. A database
+    # created from an unversioned copy of that script already has the rules
+    # (and newer columns this rebuild would drop): its tables are left alone.
+    sales_indexes = [row['sql'] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales' AND sql IS NOT NULL")]
+    items_indexes = [row['sql'] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sale_items' AND sql IS NOT NULL")]
+    if _on_delete(conn, 'sales', 'customers') != 'SET NULL':
+        _rebuild_table(conn, 'sales', '''
+            CREATE TABLE sales (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id INTEGER,
+                user_id INTEGER NOT NULL,
+                total_amount REAL NOT NULL,
+                amount_paid REAL NOT NULL,
+                change_given REAL NOT NULL,
+                payment_method TEXT NOT NULL,
+                sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE SET NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''', sales_indexes)
+    if _on_delete(conn, 'sale_items', 'sales') != 'CASCADE':
+        _rebuild_table(conn, 'sale_items', '''
+            CREATE TABLE sale_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sale_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL,
+                FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE CASCADE,
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        ''', items_indexes)
+
+def _daily_rollup(conn):
+    # Per day and payment method sale totals, kept up to date by
+    # pos_services when sales are recorded or deleted, so the summary, daily
+    # and monthly reports read one row per day instead of every sale
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            sale_count INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            min_sale REAL NOT NULL,
+            max_sale REAL NOT NULL,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+        SELECT DATE(sale_date), payment_method, COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+        FROM sales
+        GROUP BY DATE(sale_date), payment_method
+    ''')
+
+def _history_index(conn):
+    # Keyset pagination of sale history on (sale_date, id)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_history ON sales(sale_date, id)')
+
+def _product_search(conn):
+    # Full text index over product name and barcode for the catalog search.
+    # It reads its text from products (external content) and is kept in
+    # sync by triggers; stock updates do not touch it.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, barcode, content='products', content_rowid='id', prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, barcode ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+            INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END
+    ''')
+    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+def phone_key(phone):
+    # Phone digits reversed, so the last few digits a cashier types are a
+    # prefix of the key and match through idx_customers_phone_key whatever
+    # the number's formatting or country code
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[::-1] or None
+
+def _customer_search(conn):
+    # Phone, email and name lookups for the customer search. phone_key is
+    # written by pos_services whenever a phone number is saved. The one
+    # letter prefix index keeps "carlos m" fast on large customer tables.
+    if not _has_column(conn, 'customers', 'phone_key'):
+        conn.execute('ALTER TABLE customers ADD COLUMN phone_key TEXT')
+    rows = conn.execute('SELECT id, phone FROM customers WHERE phone IS NOT NULL').fetchall()
+    conn.executemany('UPDATE customers SET phone_key = ? WHERE id = ?',
+                     [(phone_key(row['phone']), row['id']) for row in rows])
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_customers_phone_key ON customers(phone_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email COLLATE NOCASE)')
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            name, content='customers', content_rowid='id', prefix='1 2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO customers_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''')
+    conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+
+def _bulk_load_switch(conn):
+    # Bulk loads (pos_transfer) insert a row into bulk_load for the length
+    # of their own transaction and index the rows they wrote in one pass;
+    # the per-row product search triggers stand down while it is there.
+    # Nobody else can see the row: it is deleted before that commit.
+    conn.execute('CREATE TABLE IF NOT EXISTS bulk_load (started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+    for name in ('products_fts_insert', 'products_fts_delete', 'products_fts_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    _product_search_triggers(conn)
+
+def _product_search_triggers(conn):
+    conn.execute('''
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+            INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER products_fts_update AFTER UPDATE OF name, barcode ON products
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+            INSERT INTO products_fts (rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END
+    ''')
+
+
+# Tables whose changes are logged for incremental backups (pos_backup)
+TRACKED_TABLES = ('users', 'customers', 'products', 'sales', 'sale_items')
+
+def _change_log_triggers(conn, table):
+    # Shared with migrations that rebuild a tracked table (dropping the
+    # table drops its triggers). Changes are only logged while an
+    # incremental backup chain exists (a backup_state row).
+    for event, ref in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_log_{event.lower()} AFTER {event} ON {table}
+            WHEN EXISTS (SELECT 1 FROM backup_state) BEGIN
+                INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {ref}.id);
+            END
+        ''')
+
+def _change_tracking(conn):
+    # Every insert, update and delete on the tracked tables appends the
+    # row's id to change_log. An incremental backup copies the current
+    # version of each logged row and then prunes the log up to the last
+    # seq it saw, recorded with the backup chain's id in backup_state.
+    # AUTOINCREMENT keeps seq increasing after the log is pruned empty.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS backup_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            chain TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in TRACKED_TABLES:
+        _change_log_triggers(conn, table)
+
+
+def _integer_money(conn):
+    # Money columns hold whole cents as INTEGER (see pos_money), so sums are
+    # exact and run on SQLite's integer arithmetic. A REAL column would turn
+    # the cents back into floats, so each table is rebuilt with the new type.
+    # Tables created from an unversioned copy of pos_database.py may already
+    # have it; the rebuild is skipped for those.
+    def cents(column):
+        return f'CAST(ROUND({column} * 100) AS INTEGER)'
+
+    def indexes(table):
+        return [row['sql'] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+
+    if _column_type(conn, 'products', 'price') == 'INTEGER':
+        return
+    _rebuild_table(conn, 'products', '''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            barcode TEXT UNIQUE,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            stock INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    ''', indexes('products'), {'price': cents('price')})
+    _rebuild_table(conn, 'sales', '''
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            user_id INTEGER NOT NULL,
+            total_amount INTEGER NOT NULL,
+            amount_paid INTEGER NOT NULL,
+            change_given INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE SET NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''', indexes('sales'), {column: cents(column) for column in ('total_amount', 'amount_paid', 'change_given')})
+    _rebuild_table(conn, 'sale_items', '''
+        CREATE TABLE sale_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''', indexes('sale_items'), {'price': cents('price')})
+    _product_search_triggers(conn)
+    for table in ('products', 'sales', 'sale_items'):
+        _change_log_triggers(conn, table)
+
+    # The rollup is derived from sales: recreate it with integer columns
+    conn.execute('DROP TABLE daily_rollup')
+    conn.execute('''
+        CREATE TABLE daily_rollup (
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            sale_count INTEGER NOT NULL,
+            revenue INTEGER NOT NULL,
+            min_sale INTEGER NOT NULL,
+            max_sale INTEGER NOT NULL,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+        SELECT DATE(sale_date), payment_method, COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+        FROM sales
+        GROUP BY DATE(sale_date), payment_method
+    ''')
+
+
+# sale_date is a UTC 'YYYY-MM-DD HH:MM:SS' text timestamp
+SALE_TIME_COLUMNS = (
+    ('sale_epoch', "CAST(strftime('%s', sale_date) AS INTEGER)"),
+    ('sale_day', "CAST(strftime('%Y%m%d', sale_date) AS INTEGER)"),
+    ('sale_month', "CAST(strftime('%Y%m', sale_date) AS INTEGER)"),
+)
+
+def _sale_time_buckets(conn):
+    # Integer time columns on sales: Unix seconds, day (YYYYMMDD) and month
+    # (YYYYMM). They are virtual generated columns, so every write path
+    # fills them with no code change; the values are stored in the indexes,
+    # which is where the range scans read them. History pages walk
+    # (sale_epoch, id); reports and the rollup range over sale_day, whose
+    # index also covers the rollup aggregates. A month is a range of days,
+    # so sale_month needs no index of its own. The text date indexes are
+    # no longer used by any query.
+    for column, expression in SALE_TIME_COLUMNS:
+        if not _has_column(conn, 'sales', column):
+            conn.execute(f'ALTER TABLE sales ADD COLUMN {column} INTEGER GENERATED ALWAYS AS ({expression}) VIRTUAL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_epoch ON sales(sale_epoch, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_day ON sales(sale_day, payment_method, total_amount)')
+    conn.execute('DROP INDEX IF EXISTS idx_sales_history')
+    conn.execute('DROP INDEX IF EXISTS idx_sales_date')
+
+    # The rollup is keyed by the same integer day
+    conn.execute('DROP TABLE daily_rollup')
+    conn.execute('''
+        CREATE TABLE daily_rollup (
+            day INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            sale_count INTEGER NOT NULL,
+            revenue INTEGER NOT NULL,
+            min_sale INTEGER NOT NULL,
+            max_sale INTEGER NOT NULL,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+        SELECT sale_day, payment_method, COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+        FROM sales
+        GROUP BY sale_day, payment_method
+    ''')
+
+
+def _system_settings(conn):
+    # Settings shared by every till, read at runtime (SQL tracing for now)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS system_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    conn.executemany('INSERT OR IGNORE INTO system_settings (key, value) VALUES (?, ?)',
+                     [('sql_trace', '0'), ('slow_query_ms', '100')])
+
+
+def _sale_journal_key(conn):
+    # Sales written from a till's sales journal (pos_journal) carry the
+    # entry's key, so replaying the journal after a crash cannot record a
+    # sale twice
+    if not _has_column(conn, 'sales', 'journal_key'):
+        conn.execute('ALTER TABLE sales ADD COLUMN journal_key TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_journal_key ON sales(journal_key)
+        WHERE journal_key IS NOT NULL
+    ''')
+
+
+def _sales_generation(conn):
+    # A counter for cached report results (pos_services): bumped whenever
+    # a recorded sale or sale line changes or goes away, or a sale is
+    # inserted below the highest id. Sales appended in the usual way leave
+    # it alone, so a cached result stays good for everything up to the
+    # highest sale id it saw. Restores set it to a random value; bulk loads
+    # (bulk_load) pause the triggers and bump it once themselves.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sales_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO sales_generation (id, generation) VALUES (1, 0)')
+    for name, event, condition in (
+            ('sales_generation_insert', 'INSERT ON sales', 'EXISTS (SELECT 1 FROM sales WHERE id > new.id)'),
+            ('sales_generation_update', 'UPDATE ON sales', None),
+            ('sales_generation_delete', 'DELETE ON sales', None),
+            ('sale_items_generation_insert', 'INSERT ON sale_items',
+             'EXISTS (SELECT 1 FROM sales WHERE id > new.sale_id)'),
+            ('sale_items_generation_update', 'UPDATE ON sale_items', None),
+            ('sale_items_generation_delete', 'DELETE ON sale_items', None),
+            # product_sales shows product names
+            ('products_generation_rename', 'UPDATE OF name ON products', None)):
+        when = 'NOT EXISTS (SELECT 1 FROM bulk_load)' + (f' AND {condition}' if condition else '')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event}
+            WHEN {when} BEGIN
+                UPDATE sales_generation SET generation = generation + 1;
+            END
+        ''')
+
+
+def _products_generation(conn):
+    # A counter for the tills' product caches (pos_cache): bumped whenever
+    # a product is added, removed, renamed, re-barcoded or repriced, so a
+    # till sees changes made by other tills and the back office. Stock
+    # updates leave it alone (every sale makes one). Bulk loads (bulk_load)
+    # pause the triggers and bump it once themselves; restores set it to a
+    # random value.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS products_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO products_generation (id, generation) VALUES (1, 0)')
+    for name, event in (('products_generation_insert', 'INSERT ON products'),
+                        ('products_generation_update', 'UPDATE OF barcode, name, price ON products'),
+                        ('products_generation_delete', 'DELETE ON products')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event}
+            WHEN NOT EXISTS (SELECT 1 FROM bulk_load) BEGIN
+                UPDATE products_generation SET generation = generation + 1;
+            END
+        ''')
+
+
+def _change_log_on_demand(conn):
+    # Stores that never take incremental backups logged every change with
+    # nothing to prune the log: log only once a chain has been started
+    # (pos_backup starts one before its base backup), and drop what was
+    # logged without one
+    for table in TRACKED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {table}_log_{event}')
+        _change_log_triggers(conn, table)
+    if conn.execute('SELECT 1 FROM backup_state').fetchone() is None:
+        conn.execute('DELETE FROM change_log')
+
+
+# (version, description, function, rebuilds tables)
+MIGRATIONS = [
+    (1, 'base schema', _base_schema, False),
+    (2, 'report, history and foreign key indexes', _indexes, False),
+    (3, 'ON DELETE rules for sales and sale_items', _on_delete_rules, True),
+    (4, 'daily sales rollup', _daily_rollup, False),
+    (5, 'sale history index', _history_index, False),
+    (6, 'product full text search', _product_search, False),
+    (7, 'customer search by phone, email and name', _customer_search, False),
+    (8, 'bulk load switch for product search triggers', _bulk_load_switch, False),
+    (9, 'change log for incremental backups', _change_tracking, False),
+    (10, 'money as integer cents', _integer_money, True),
+    (11, 'integer sale time buckets', _sale_time_buckets, False),
+    (12, 'system settings', _system_settings, False),
+    (13, 'sales journal keys', _sale_journal_key, False),
+    (14, 'sales generation for cached reports', _sales_generation, False),
+    (15, 'products generation for till product caches', _products_generation, False),
+    (16, 'change log only while an incremental backup chain exists', _change_log_on_demand, False),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def _check_foreign_keys(conn, version):
+    # With enforcement off a rebuild copies rows whose parent is missing
+    # without complaint; refuse to commit it, as SQLite's own table rebuild
+    # procedure does
+    problems = conn.execute('PRAGMA foreign_key_check').fetchall()
+    if problems:
+        shown = '; '.join(f"{row[0]} row {row[1]} -> missing {row[2]}" for row in problems[:5])
+        raise MigrationError(f"Migration {version} left {len(problems)} row(s) with a missing parent "
+                             f"({shown}). Fix or delete them and run the upgrade again.")
+
+def migrate(conn, verbose=False):
+    # Bring the database up to LATEST_VERSION. Returns a list of
+    # (version, description, seconds) for the migrations applied here.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL NOT NULL
+        )
+    ''')
+    applied = []
+    for version, description, apply, rebuilds in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        if rebuilds:
+            # Table rebuilds need foreign key enforcement off (it cannot be
+            # changed inside a transaction)
+            conn.execute('PRAGMA foreign_keys = OFF')
+        try:
+            start = time.perf_counter()
+            conn.execute('BEGIN IMMEDIATE')
+            # Another till may have applied it while we waited for the lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            if rebuilds:
+                _check_foreign_keys(conn, version)
+            elapsed = time.perf_counter() - start
+            conn.execute('INSERT INTO schema_migrations (version, description, duration_ms) VALUES (?, ?, ?)',
+                         (version, description, elapsed * 1000))
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if rebuilds:
+                conn.execute('PRAGMA foreign_keys = ON')
+        applied.append((version, description, elapsed))
+        if verbose:
+            print(f"Applied migration {version} ({description}) in {elapsed * 1000:.1f} ms")
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade a POS database to the latest schema')
+    parser.add_argument('--db', help='database file (default: POS_DB_PATH or pos_database.db)')
+    parser.add_argument('--status', action='store_true', help='show the schema version and exit')
+    args = parser.parse_args()
+
+    from pos_db import DB_PATH, ConnectionPool
+    pool = ConnectionPool(args.db or DB_PATH)
+    try:
+        _run(pool, args)
+    finally:
+        pool.close()
+
+def _run(pool, args):
+    with pool.writer() as conn:
+        current = schema_version(conn)
+        if args.status:
+            print(f"Schema version {current} (latest {LATEST_VERSION})")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_migrations'").fetchone() is None:
+                return
+            for row in conn.execute('SELECT * FROM schema_migrations ORDER BY version'):
+                print(f"  {row['version']}: {row['description']} "
+                      f"applied {row['applied_at']} in {row['duration_ms']:.1f} ms")
+        else:
+            try:
+                applied = migrate(conn, verbose=True)
+            except MigrationError as e:
+                print(e)
+                sys.exit(1)
+            if not applied:
+                print(f"Schema already at version {schema_version(conn)}.")
+
+if __name__ == '__main__':
+    main()
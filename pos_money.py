@@ -0,0 +1,99 @@
+import sqlite3
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+
+# Money as a whole number of cents. Prices, totals and payments are stored
+# as INTEGER cents in the database and added up as integers, so sums are
+# exact however many sales they cover. Money wraps the cents on the till
+# side: it parses what the cashier types, adds and multiplies without
+# float rounding, and formats as 12.34. Money values can be passed straight
+# to sqlite3 as query parameters.
+
+CENTS = 100
+
+
+@total_ordering
+class Money:
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if isinstance(cents, Money):
+            cents = cents.cents
+        if not isinstance(cents, int):
+            # A float here is almost always an amount in currency units
+            raise TypeError(f"Money takes whole cents, not {type(cents).__name__}; use Money.parse")
+        self.cents = cents
+
+    @classmethod
+    def parse(cls, text):
+        # '12', '12.5', '12.50' or '$1,234.50'; ValueError otherwise.
+        # Fractions of a cent are rounded half up.
+        cleaned = str(text).strip().replace(',', '').lstrip('$')
+        try:
+            amount = Decimal(cleaned)
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {text!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {text!r}")
+        return cls(int((amount * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+
+    @classmethod
+    def from_float(cls, amount):
+        # For amounts that were stored as REAL (old backups, float inputs)
+        return cls.parse(repr(float(amount)))
+
+    def __add__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.cents + other.cents)
+
+    def __sub__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.cents - other.cents)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int):
+            return NotImplemented
+        return Money(self.cents * quantity)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents == other.cents
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents < other.cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __str__(self):
+        sign = '-' if self.cents < 0 else ''
+        units, cents = divmod(abs(self.cents), CENTS)
+        return f"{sign}{units}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money({self.cents})"
+
+    def __format__(self, spec):
+        # Width and alignment apply to the 12.34 text: f"{total:>10}"
+        return format(str(self), spec)
+
+
+def money(cents):
+    # Format a cents value read from the database (None as 0.00)
+    return str(Money(cents or 0))
+
+
+sqlite3.register_adapter(Money, lambda value: value.cents)
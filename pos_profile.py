@@ -0,0 +1,229 @@
+import atexit
+import builtins
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pos_db import LANE
+
+# Profiling for the terminal POS, switched on at startup:
+#
+# python pos_system.py --profile          cProfile around each menu action
+# python pos_system.py --profile=sample   stack sampling, cheap enough to
+#                                         leave on for a shift
+#
+# Output goes to PROFILE_DIR. Time spent waiting at an input() prompt is
+# left out in both modes, so the numbers show where the till itself spends
+# its time rather than how long the cashier took to type.
+
+PROFILE_DIR = os.environ.get('POS_PROFILE_DIR', 'pos_profiles')
+# .prof files kept per lane; older ones are deleted
+PROFILE_KEEP = 50
+SUMMARY_FUNCTIONS = 30
+SAMPLE_INTERVAL = float(os.environ.get('POS_PROFILE_SAMPLE_MS', '10')) / 1000
+SAMPLE_WRITE_SECONDS = 60
+
+_mode = None
+_directory = PROFILE_DIR
+_local = threading.local()
+# Threads blocked in input()
+_waiting = set()
+_builtin_input = builtins.input
+
+def _input(prompt=''):
+    # Stand-in for input() while profiling: pauses the action's profiler
+    # and tells the sampler the thread is waiting
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    thread = threading.get_ident()
+    _waiting.add(thread)
+    try:
+        return _builtin_input(prompt)
+    finally:
+        _waiting.discard(thread)
+        if profiler is not None:
+            profiler.enable()
+
+
+def start(mode, directory=None):
+    # mode is 'cprofile' or 'sample'
+    global _mode, _directory
+    if mode not in ('cprofile', 'sample'):
+        raise ValueError(f"Unknown profile mode: {mode}")
+    _mode = mode
+    _directory = directory or PROFILE_DIR
+    os.makedirs(_directory, exist_ok=True)
+    builtins.input = _input
+    if mode == 'cprofile':
+        _session.clear()
+    else:
+        sampler.start()
+        atexit.register(sampler.stop)
+
+def run(name, func, *args, **kwargs):
+    # Run one menu action, profiled if profiling is on
+    if _mode == 'cprofile':
+        return _run_profiled(name, func, args, kwargs)
+    if _mode == 'sample':
+        previous = sampler.action
+        sampler.action = name
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.action = previous
+    return func(*args, **kwargs)
+
+
+# cProfile mode: one .prof file per action run (the last PROFILE_KEEP are
+# kept), plus lane{N}-summary.txt with the top cumulative functions over
+# the kept runs, rewritten after each action
+
+_session = []
+
+def _run_profiled(name, func, args, kwargs):
+    if getattr(_local, 'profiler', None) is not None:
+        # Nested action: already counted by the outer one
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    _local.profiler = profiler
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _local.profiler = None
+        try:
+            _save_profile(name, profiler)
+        except OSError as e:
+            print(f"Could not save profile: {e}")
+
+def _save_profile(name, profiler):
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(_directory, f"lane{LANE}-{stamp}-{name}.prof")
+    profiler.dump_stats(path)
+    _session.append((name, path))
+    _prune()
+    _session[:] = [(action, saved) for action, saved in _session if os.path.exists(saved)]
+
+    stats = None
+    for _, saved in _session:
+        if stats is None:
+            stats = pstats.Stats(saved, stream=io.StringIO())
+        else:
+            stats.add(saved)
+    if stats is None:
+        return
+    runs = Counter(action for action, _ in _session)
+    out = io.StringIO()
+    out.write(f"Lane {LANE}, last {len(_session)} profiled actions (input() waits excluded)\n")
+    for action, count in runs.most_common():
+        out.write(f"  {action}: {count}\n")
+    stats.stream = out
+    stats.sort_stats('cumulative').print_stats(SUMMARY_FUNCTIONS)
+    _write_text(os.path.join(_directory, f"lane{LANE}-summary.txt"), out.getvalue())
+
+def _prune():
+    saved = sorted(entry for entry in os.listdir(_directory)
+                   if entry.startswith(f"lane{LANE}-") and entry.endswith('.prof'))
+    for entry in saved[:-PROFILE_KEEP]:
+        os.remove(os.path.join(_directory, entry))
+
+def _write_text(path, text):
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+# Sample mode: a background thread looks at the main thread's stack every
+# SAMPLE_INTERVAL and counts it, skipping samples taken while it waits for
+# input. Stacks are written in the folded format used by flame graph tools
+# (lane{N}-samples.folded), with the top functions in lane{N}-samples.txt.
+
+class Sampler:
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.action = None
+        self.samples = 0
+        self.idle = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._target = threading.main_thread().ident
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='pos-profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+
+    def _loop(self):
+        last_write = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time.monotonic() - last_write >= SAMPLE_WRITE_SECONDS:
+                last_write = time.monotonic()
+                try:
+                    self.write()
+                except OSError:
+                    pass
+
+    def sample(self):
+        frame = sys._current_frames().get(self._target)
+        if frame is None:
+            return
+        self.samples += 1
+        if self._target in _waiting:
+            self.idle += 1
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        stack.append(self.action or 'menu')
+        self._stacks[';'.join(reversed(stack))] += 1
+
+    def write(self):
+        stacks = self._stacks.copy()
+        _write_text(os.path.join(_directory, f"lane{LANE}-samples.folded"),
+                    ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        actions = Counter()
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks.items():
+            action, *functions = stack.split(';')
+            actions[action] += count
+            own[functions[-1]] += count
+            for function in set(functions):
+                total[function] += count
+        busy = sum(stacks.values()) or 1
+        out = io.StringIO()
+        out.write(f"Lane {LANE}: {self.samples:,} samples every {self.interval * 1000:g} ms, "
+                  f"{sum(stacks.values()):,} busy, {self.idle:,} waiting for input\n")
+        for action, count in actions.most_common():
+            out.write(f"  {action}: {count * 100 / busy:.1f}%\n")
+        out.write("\n")
+        out.write(f"{'Own %':>7} {'Total %':>8}  Function\n")
+        for function, count in total.most_common(SUMMARY_FUNCTIONS):
+            out.write(f"{own[function] * 100 / busy:>7.1f} {count * 100 / busy:>8.1f}  {function}\n")
+        _write_text(os.path.join(_directory, f"lane{LANE}-samples.txt"), out.getvalue())
+
+
+sampler = Sampler()
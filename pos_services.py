@@ -0,0 +1,970 @@
+import atexit
+import calendar
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pos_db import LANE, reader, writer, begin_immediate, with_retry, query_stats
+from pos_cache import product_cache, report_cache
+from pos_journal import SalesJournal
+import pos_metrics as metrics
+from pos_money import Money
+from pos_migrations import phone_key
+
+# Headless POS operations. Everything here takes plain arguments and returns
+# plain data (dicts, lists, ids) so it can be driven from the terminal menus
+# in pos_system, from scripts and from the benchmarks alike. Nothing here
+# reads input or prints. Amounts are whole cents: prices and payments are
+# passed in as Money, and amounts read back are integer cents.
+
+
+class ProductNotFoundError(LookupError):
+    pass
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__("Not enough stock for: " + ", ".join(p['name'] for p in products))
+
+
+def _rows(rows):
+    return [dict(row) for row in rows]
+
+def _row(row):
+    return dict(row) if row is not None else None
+
+def _update(table, record_id, fields, touch=True):
+    # UPDATE only the given columns; fields maps column name -> new value
+    if not fields:
+        return False
+    assignments = [f"{column} = ?" for column in fields]
+    if touch:
+        assignments.append("updated_at = CURRENT_TIMESTAMP")
+    with writer() as conn:
+        conn.execute(f"UPDATE {table} SET {', '.join(assignments)} WHERE id = ?",
+                     [*fields.values(), record_id])
+    return True
+
+# Sales carry integer time columns derived from sale_date (pos_migrations):
+# sale_epoch in Unix seconds, sale_day as YYYYMMDD and sale_month as
+# YYYYMM; daily_rollup.day is a YYYYMMDD integer too. Date filters become
+# integer bounds on those columns, so every range filter and grouping is an
+# index range scan rather than date parsing row by row.
+
+def _parse_date(text, fmt, expected):
+    try:
+        return datetime.strptime(text.strip(), fmt)
+    except ValueError:
+        raise ValueError(f"Invalid date {text!r}, expected {expected}")
+
+def day_key(date_text):
+    # 'YYYY-MM-DD' as the integer 20241231
+    day = _parse_date(date_text, '%Y-%m-%d', 'YYYY-MM-DD')
+    return day.year * 10000 + day.month * 100 + day.day
+
+def month_key(month_text):
+    # 'YYYY-MM' as the integer 202412
+    month = _parse_date(month_text, '%Y-%m', 'YYYY-MM')
+    return month.year * 100 + month.month
+
+def _between(column, low, high):
+    # WHERE clause and parameters for an optional inclusive range
+    conditions = []
+    params = []
+    if low is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"{column} <= ?")
+        params.append(high)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+def day_range(column, start_date=None, end_date=None):
+    # Inclusive YYYY-MM-DD range on a YYYYMMDD column
+    return _between(column, day_key(start_date) if start_date else None, day_key(end_date) if end_date else None)
+
+def month_range(column, start_month=None, end_month=None):
+    # Inclusive YYYY-MM range on a YYYYMMDD column
+    return _between(column, month_key(start_month) * 100 + 1 if start_month else None,
+                    month_key(end_month) * 100 + 31 if end_month else None)
+
+def epoch_range(column, start_date=None, end_date=None):
+    # Inclusive YYYY-MM-DD range on a Unix seconds column (UTC days)
+    low = high = None
+    if start_date:
+        low = calendar.timegm(_parse_date(start_date, '%Y-%m-%d', 'YYYY-MM-DD').timetuple())
+    if end_date:
+        high = calendar.timegm(_parse_date(end_date, '%Y-%m-%d', 'YYYY-MM-DD').timetuple()) + 86399
+    return _between(column, low, high)
+
+# Users
+
+def authenticate(username, password):
+    with reader() as conn:
+        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+    if user and user['password'] == password:
+        return dict(user)
+    return None
+
+def list_users():
+    with reader() as conn:
+        return _rows(conn.execute('SELECT id, username, full_name, role FROM users ORDER BY username'))
+
+def get_user(user_id):
+    with reader() as conn:
+        return _row(conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone())
+
+def add_user(username, password, full_name, role):
+    with writer() as conn:
+        return conn.execute('''
+            INSERT INTO users (username, password, full_name, role)
+            VALUES (?, ?, ?, ?)
+        ''', (username, password, full_name, role)).lastrowid
+
+def update_user(user_id, fields):
+    return _update('users', user_id, fields, touch=False)
+
+def change_password(user_id, password):
+    return _update('users', user_id, {'password': password}, touch=False)
+
+def user_sale_count(user_id):
+    with reader() as conn:
+        return conn.execute('SELECT COUNT(*) FROM sales WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+def delete_user(user_id):
+    with writer() as conn:
+        conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+
+
+# Catalog
+
+def lookup_barcode(barcode):
+    return product_cache.get_by_barcode(barcode)
+
+def get_product(product_id):
+    return product_cache.get_by_id(product_id)
+
+def list_products():
+    with reader() as conn:
+        return _rows(conn.execute('SELECT * FROM products ORDER BY name'))
+
+PRODUCT_SEARCH_LIMIT = 20
+
+def _match_query(text):
+    # Every word must match, each as a prefix: "choc 45" finds
+    # "Chocolate Bar" with barcode 4561...
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_products(text, limit=PRODUCT_SEARCH_LIMIT):
+    # Best matches first by name or barcode, using products_fts
+    query = _match_query(text)
+    if not query:
+        return []
+    with reader() as conn:
+        return _rows(conn.execute('''
+            SELECT p.*
+            FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY products_fts.rank, p.name
+            LIMIT ?
+        ''', (query, limit)))
+
+def add_product(barcode, name, price, stock):
+    with writer() as conn:
+        product_id = conn.execute('INSERT INTO products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                                  (barcode or None, name, price, stock)).lastrowid
+    product_cache.refresh(product_id)
+    return product_id
+
+def update_product(product_id, fields):
+    changed = _update('products', product_id, fields)
+    if changed:
+        product_cache.refresh(product_id)
+    return changed
+
+def product_sale_count(product_id):
+    with reader() as conn:
+        return conn.execute('SELECT COUNT(*) FROM sale_items WHERE product_id = ?', (product_id,)).fetchone()[0]
+
+def delete_product(product_id):
+    with writer() as conn:
+        conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
+    product_cache.remove(product_id)
+
+
+# Customers
+
+def list_customers():
+    with reader() as conn:
+        return _rows(conn.execute('SELECT * FROM customers ORDER BY name'))
+
+def get_customer(customer_id):
+    with reader() as conn:
+        return _row(conn.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone())
+
+CUSTOMER_SEARCH_LIMIT = 20
+# Name matches ranked per search; a broad prefix ("jo") can match a large
+# share of the customers, and ranking them all costs tens of milliseconds
+CUSTOMER_SEARCH_CANDIDATES = 500
+
+def search_customers(text, limit=CUSTOMER_SEARCH_LIMIT):
+    # An email (contains @) matches by prefix on idx_customers_email, a
+    # phone number (three or more digits, no letters) by its last digits on
+    # idx_customers_phone_key, and anything else by name through
+    # customers_fts, best matches first among the first
+    # CUSTOMER_SEARCH_CANDIDATES matches (all of them, unless the search is
+    # too broad to be useful anyway). Phone and email matches come back in
+    # index order so the scan stops after limit rows.
+    text = text.strip()
+    if '@' in text:
+        where, params = ("email >= ? COLLATE NOCASE AND email < ? COLLATE NOCASE",
+                         _prefix_range(text.lower(), nocase=True))
+        order = "email COLLATE NOCASE"
+    elif not re.search(r'[^\W\d_]', text) and len(re.sub(r'\D', '', text)) >= 3:
+        where, params = "phone_key >= ? AND phone_key < ?", _prefix_range(phone_key(text))
+        order = "phone_key"
+    else:
+        query = _match_query(text)
+        if not query:
+            return []
+        with reader() as conn:
+            return _rows(conn.execute('''
+                SELECT c.*
+                FROM (SELECT rowid, rank FROM customers_fts WHERE customers_fts MATCH ? LIMIT ?) m
+                JOIN customers c ON c.id = m.rowid
+                ORDER BY m.rank, c.name
+                LIMIT ?
+            ''', (query, CUSTOMER_SEARCH_CANDIDATES, limit)))
+    with reader() as conn:
+        return _rows(conn.execute(f'''
+            SELECT * FROM customers WHERE {where} ORDER BY {order} LIMIT ?
+        ''', [*params, limit]))
+
+def _prefix_range(prefix, nocase=False):
+    # [prefix, next prefix) for an index range scan. NOCASE compares text
+    # folded to lower case, so the prefix must be lower case already and
+    # the bound must not be an upper case letter ('@' + 1 is 'A')
+    bound = chr(ord(prefix[-1]) + 1)
+    if nocase and 'A' <= bound <= 'Z':
+        bound = '['
+    return [prefix, prefix[:-1] + bound]
+
+def add_customer(name, phone=None, email=None, address=None):
+    with writer() as conn:
+        return conn.execute('''
+            INSERT INTO customers (name, phone, email, address, phone_key)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (name, phone or None, email or None, address or None, phone_key(phone))).lastrowid
+
+def update_customer(customer_id, fields):
+    if 'phone' in fields:
+        fields = dict(fields, phone_key=phone_key(fields['phone']))
+    return _update('customers', customer_id, fields)
+
+def customer_sale_count(customer_id):
+    with reader() as conn:
+        return conn.execute('SELECT COUNT(*) FROM sales WHERE customer_id = ?', (customer_id,)).fetchone()[0]
+
+def delete_customer(customer_id):
+    with writer() as conn:
+        conn.execute('DELETE FROM customers WHERE id = ?', (customer_id,))
+
+
+# Sales
+
+def add_to_cart(cart, barcode=None, product_id=None, quantity=1):
+    # Add a product to the cart by barcode or id, checking the stock known to
+    # this lane (the authoritative check happens when the sale is recorded)
+    start = time.perf_counter()
+    product = lookup_barcode(barcode) if barcode is not None else get_product(product_id)
+    metrics.scan_lookup.observe(time.perf_counter() - start, cart.user_id)
+    if product is None:
+        raise ProductNotFoundError(barcode if barcode is not None else product_id)
+    if quantity + cart.quantity_of(product['id']) > product['stock']:
+        # The cached stock may predate a restock elsewhere: re-read it
+        # before refusing
+        product = product_cache.refresh(product['id'])
+        if product is None:
+            raise ProductNotFoundError(barcode if barcode is not None else product_id)
+        if quantity + cart.quantity_of(product['id']) > product['stock']:
+            raise InsufficientStockError([product])
+    return cart.add(product, quantity)
+
+# Record a completed sale in a single IMMEDIATE transaction. All lines go in
+# with one executemany and stock is decremented by one set-based UPDATE; if
+# any line would take stock negative the whole sale is rolled back. If other
+# lanes keep the database locked the whole transaction is retried. With
+# group commit on, sales finalized together share one transaction.
+def record_sale(customer_id, user_id, lines, total, amount_paid, change, payment_method):
+    args = (customer_id, user_id, lines, total, amount_paid, change, payment_method)
+    if group_committer is not None:
+        return group_committer.submit(args)
+    return with_retry(_record_sale, *args)
+
+def _record_sale(customer_id, user_id, lines, total, amount_paid, change, payment_method):
+    with writer() as conn:
+        metrics.lock_wait.observe(begin_immediate(conn), user_id)
+        return _write_sale(conn, customer_id, user_id, lines, total, amount_paid, change, payment_method)
+
+def _write_sale(conn, customer_id, user_id, lines, total, amount_paid, change, payment_method):
+    # The sale's statements, inside the caller's transaction
+    sale_id = conn.execute('''
+        INSERT INTO sales (customer_id, user_id, total_amount, amount_paid, change_given, payment_method)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (customer_id, user_id, total, amount_paid, change, payment_method)).lastrowid
+
+    _insert_items(conn, sale_id, [(line.product_id, line.quantity, line.price) for line in lines])
+
+    # The write lock is held from BEGIN IMMEDIATE, so no other lane can
+    # change stock between this check and the update
+    short = conn.execute('''
+        SELECT p.id, p.name, p.stock
+        FROM products p
+        JOIN (SELECT product_id, SUM(quantity) AS quantity
+              FROM sale_items WHERE sale_id = ? GROUP BY product_id) si
+          ON p.id = si.product_id
+        WHERE p.stock < si.quantity
+    ''', (sale_id,)).fetchall()
+    if short:
+        raise InsufficientStockError(_rows(short))
+
+    _take_stock(conn, sale_id)
+    _rollup_add(conn, sale_id)
+    return sale_id
+
+def _insert_items(conn, sale_id, items):
+    # items: (product_id, quantity, price) tuples
+    conn.executemany('''
+        INSERT INTO sale_items (sale_id, product_id, quantity, price)
+        VALUES (?, ?, ?, ?)
+    ''', [(sale_id, *item) for item in items])
+
+def _take_stock(conn, sale_id):
+    conn.execute('''
+        UPDATE products SET stock = products.stock - si.quantity
+        FROM (SELECT product_id, SUM(quantity) AS quantity
+              FROM sale_items WHERE sale_id = ? GROUP BY product_id) si
+        WHERE products.id = si.product_id
+    ''', (sale_id,))
+
+# Group commit. When several threads in this process finalize at once
+# (a bank of self-checkouts served by one process), their sales are
+# written in one transaction: the first to arrive leads, waits up to the
+# window for others, and commits the batch with one COMMIT. Each sale runs
+# inside its own savepoint, so a sale that runs out of stock is rolled back
+# alone and only its caller gets InsufficientStockError. Sales arriving
+# while a batch commits form the next batch. Set POS_GROUP_COMMIT_MS (0 =
+# no waiting, batch only what queues up during a commit) to turn it on.
+
+GROUP_COMMIT_MS = os.environ.get('POS_GROUP_COMMIT_MS')
+GROUP_COMMIT_MAX = 64
+
+
+class _SaleRequest:
+    __slots__ = ('args', 'sale_id', 'error', 'finished')
+
+    def __init__(self, args):
+        self.args = args
+        self.sale_id = None
+        self.error = None
+        self.finished = False
+
+
+class GroupCommitter:
+
+    def __init__(self, window_ms=0, max_batch=GROUP_COMMIT_MAX):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._queue = []
+        self._leading = False
+        self.batches = 0
+        self.sales = 0
+
+    def submit(self, args):
+        # Returns the sale id, or raises this sale's error
+        request = _SaleRequest(args)
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify_all()
+            while not request.finished:
+                if self._leading:
+                    self._cond.wait()
+                    continue
+                self._leading = True
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+                self._cond.release()
+                try:
+                    self._commit(batch)
+                finally:
+                    self._cond.acquire()
+                    self._leading = False
+                    self.batches += 1
+                    self.sales += len(batch)
+                    for finished in batch:
+                        finished.finished = True
+                    self._cond.notify_all()
+        if request.error is not None:
+            raise request.error
+        return request.sale_id
+
+    def _commit(self, batch):
+        try:
+            with_retry(_record_sale_batch, batch)
+        except Exception as e:
+            # The batch transaction failed as a whole (database locked, disk
+            # full...): every sale in it fails
+            for request in batch:
+                request.sale_id = None
+                request.error = e
+
+    def stats(self):
+        with self._cond:
+            return {'batches': self.batches, 'sales': self.sales}
+
+
+def _record_sale_batch(batch):
+    with writer() as conn:
+        waited = begin_immediate(conn)
+        for request in batch:
+            request.sale_id = request.error = None
+            metrics.lock_wait.observe(waited, request.args[1])
+            conn.execute('SAVEPOINT sale')
+            try:
+                request.sale_id = _write_sale(conn, *request.args)
+            except (InsufficientStockError, sqlite3.IntegrityError) as e:
+                conn.execute('ROLLBACK TO sale')
+                request.error = e
+            conn.execute('RELEASE sale')
+
+group_committer = GroupCommitter(float(GROUP_COMMIT_MS)) if GROUP_COMMIT_MS else None
+
+def set_group_commit(window_ms=None):
+    # Turn group commit on with this window, or off with None
+    global group_committer
+    group_committer = GroupCommitter(window_ms) if window_ms is not None else None
+
+# Sales journal. With POS_SALES_JOURNAL set, finalize appends the sale to
+# the till's journal (pos_journal) and returns as soon as it is on disk;
+# the journal's background thread records it with record_journal_sales
+# moments later. The stock check when scanning (against this lane's
+# product cache) is then the only one: a journalled sale has already left
+# the store, so it is recorded even if it takes stock negative.
+
+sales_journal = None
+
+def open_sales_journal(path):
+    # Replay what a crash left in the journal, then drain it in the
+    # background until close_sales_journal (or exit)
+    global sales_journal
+    journal = SalesJournal(path, record_journal_sales)
+    journal.drain()
+    journal.start()
+    sales_journal = journal
+    atexit.register(close_sales_journal)
+    return journal
+
+def close_sales_journal():
+    global sales_journal
+    journal, sales_journal = sales_journal, None
+    if journal is not None:
+        journal.close()
+
+def _journal_sale(cart, user_id, total, amount_paid, change, payment_method):
+    key = f"{LANE}-{uuid.uuid4().hex}"
+    sales_journal.append({
+        'key': key,
+        'sale_date': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'customer_id': cart.customer_id,
+        'user_id': user_id,
+        'total': total.cents,
+        'amount_paid': amount_paid.cents,
+        'change': change.cents,
+        'payment_method': payment_method,
+        'items': [(line.product_id, line.quantity, line.price.cents) for line in cart],
+    })
+    return key
+
+def record_journal_sales(entries):
+    # Record journal entries in one transaction. An entry whose key is
+    # already in sales was recorded before a crash and is skipped.
+    with_retry(_record_journal_sales, entries)
+
+def _record_journal_sales(entries):
+    with writer() as conn:
+        begin_immediate(conn)
+        for entry in entries:
+            cursor = conn.execute('''
+                INSERT INTO sales (journal_key, customer_id, user_id, total_amount, amount_paid, change_given,
+                                   payment_method, sale_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (journal_key) WHERE journal_key IS NOT NULL DO NOTHING
+            ''', (entry['key'], entry['customer_id'], entry['user_id'], entry['total'], entry['amount_paid'],
+                  entry['change'], entry['payment_method'], entry['sale_date']))
+            if not cursor.rowcount:
+                continue
+            sale_id = cursor.lastrowid
+            _insert_items(conn, sale_id, entry['items'])
+            _take_stock(conn, sale_id)
+            _rollup_add(conn, sale_id)
+
+def finalize(cart, user_id, amount_paid, payment_method='cash'):
+    # Record the cart as a sale and clear it; amount_paid is Money (or
+    # cents). Returns the receipt as a dict with Money amounts; with the
+    # sales journal on it has the journal key and sale_id is None (the id
+    # exists once the journal is drained).
+    # Raises ValueError for an empty cart or short payment,
+    # InsufficientStockError if stock ran out, and sqlite3.OperationalError if
+    # the database stayed locked.
+    if not cart:
+        raise ValueError("No items in current sale to finalize.")
+    total = cart.total
+    amount_paid = Money(amount_paid)
+    if amount_paid < total:
+        raise ValueError("Amount paid cannot be less than total.")
+    change = amount_paid - total
+    start = time.perf_counter()
+    sale_id = journal_key = None
+    if sales_journal is not None:
+        journal_key = _journal_sale(cart, user_id, total, amount_paid, change, payment_method)
+    else:
+        try:
+            sale_id = record_sale(cart.customer_id, user_id, cart, total, amount_paid, change, payment_method)
+        except InsufficientStockError as e:
+            for product in e.products:
+                product_cache.refresh(product['id'])
+            raise
+    recorded = time.perf_counter()
+    metrics.finalize_commit.observe(recorded - start, user_id)
+    metrics.basket_items.observe(cart.item_count, user_id)
+    if cart.started is not None:
+        metrics.checkout.observe(recorded - cart.started, user_id)
+    for line in cart:
+        product_cache.adjust_stock(line.product_id, -line.quantity)
+    receipt = {
+        'sale_id': sale_id,
+        'journal_key': journal_key,
+        'customer_id': cart.customer_id,
+        'total': total,
+        'amount_paid': amount_paid,
+        'change': change,
+        'payment_method': payment_method,
+        'items': cart.item_count,
+    }
+    cart.clear()
+    return receipt
+
+# Sale history is read newest first in pages using keyset pagination on
+# (sale_epoch, id): each page starts just past the last row of the previous
+# one via idx_sales_epoch, so any page costs the same however long the
+# history is. Dates are formatted by SQLite.
+
+SALES_PAGE_SIZE = 20
+
+def sales_page(start_date=None, end_date=None, after=None, limit=SALES_PAGE_SIZE):
+    # after is page_key() of the last sale on the previous page
+    where, params = epoch_range('s.sale_epoch', start_date, end_date)
+    if after is not None:
+        where += (" AND " if where else " WHERE ") + "(s.sale_epoch, s.id) < (?, ?)"
+        params.extend(after)
+    with reader() as conn:
+        return _rows(conn.execute(f'''
+            SELECT s.id, s.sale_date, s.sale_epoch, strftime('%Y-%m-%d %H:%M', s.sale_date) as sale_time,
+                   s.total_amount,
+                   u.full_name as cashier,
+                   c.name as customer
+            FROM sales s
+            LEFT JOIN users u ON s.user_id = u.id
+            LEFT JOIN customers c ON s.customer_id = c.id
+            {where}
+            ORDER BY s.sale_epoch DESC, s.id DESC
+            LIMIT ?
+        ''', [*params, limit]))
+
+def page_key(sale):
+    return (sale['sale_epoch'], sale['id'])
+
+def iter_sales(start_date=None, end_date=None, batch=500):
+    # Stream the whole history (for export and scripts) a batch at a time;
+    # each batch is its own short read, so no connection is held between them
+    after = None
+    while True:
+        page = sales_page(start_date, end_date, after, batch)
+        yield from page
+        if len(page) < batch:
+            return
+        after = page_key(page[-1])
+
+def get_sale(sale_id):
+    # Returns (sale, items), or (None, []) if there is no such sale
+    with reader() as conn:
+        sale = conn.execute('''
+            SELECT s.*, u.full_name as cashier, c.name as customer
+            FROM sales s
+            LEFT JOIN users u ON s.user_id = u.id
+            LEFT JOIN customers c ON s.customer_id = c.id
+            WHERE s.id = ?
+        ''', (sale_id,)).fetchone()
+        items = conn.execute('''
+            SELECT si.*, p.name as product_name
+            FROM sale_items si
+            JOIN products p ON si.product_id = p.id
+            WHERE si.sale_id = ?
+        ''', (sale_id,)).fetchall()
+    return _row(sale), _rows(items)
+
+def sale_exists(sale_id):
+    with reader() as conn:
+        return conn.execute('SELECT 1 FROM sales WHERE id = ?', (sale_id,)).fetchone() is not None
+
+def delete_sale(sale_id):
+    # Delete a sale and put its items back into stock
+    with writer() as conn:
+        begin_immediate(conn)
+        sale = conn.execute('SELECT sale_day AS day, payment_method, total_amount FROM sales WHERE id = ?',
+                            (sale_id,)).fetchone()
+        # First, restore product stock
+        items = conn.execute('SELECT product_id, quantity FROM sale_items WHERE sale_id = ?', (sale_id,)).fetchall()
+        for item in items:
+            conn.execute('UPDATE products SET stock = stock + ? WHERE id = ?', (item['quantity'], item['product_id']))
+
+        # Then delete sale items
+        conn.execute('DELETE FROM sale_items WHERE sale_id = ?', (sale_id,))
+
+        # Finally delete the sale
+        deleted = conn.execute('DELETE FROM sales WHERE id = ?', (sale_id,)).rowcount
+        if sale is not None:
+            _rollup_remove(conn, sale['day'], sale['payment_method'], sale['total_amount'])
+
+    for item in items:
+        product_cache.adjust_stock(item['product_id'], item['quantity'])
+    return deleted > 0
+
+def delete_all_sales():
+    with writer() as conn:
+        begin_immediate(conn)
+        # First, restore all product stock
+        items = conn.execute('''
+            SELECT product_id, SUM(quantity) as total_quantity
+            FROM sale_items
+            GROUP BY product_id
+        ''').fetchall()
+
+        for item in items:
+            conn.execute('UPDATE products SET stock = stock + ? WHERE id = ?', (item['total_quantity'], item['product_id']))
+
+        # Then delete all sale items
+        conn.execute('DELETE FROM sale_items')
+
+        # Finally delete all sales
+        conn.execute('DELETE FROM sales')
+        conn.execute('DELETE FROM daily_rollup')
+
+    product_cache.load()
+
+
+# Daily rollup. Each change to sales updates daily_rollup in the same
+# transaction. A new sale is folded in and a deleted one subtracted out,
+# unless it was the day's smallest or largest sale: MIN and MAX cannot be
+# undone, so that day is recomputed from its sales.
+
+_ROLLUP_SELECT = '''
+    SELECT sale_day, payment_method, COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+    FROM sales
+'''
+
+def _rollup_add(conn, sale_id):
+    conn.execute('''
+        INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+        SELECT sale_day, payment_method, 1, total_amount, total_amount, total_amount
+        FROM sales WHERE id = ?
+        ON CONFLICT (day, payment_method) DO UPDATE SET
+            sale_count = sale_count + 1,
+            revenue = revenue + excluded.revenue,
+            min_sale = MIN(min_sale, excluded.min_sale),
+            max_sale = MAX(max_sale, excluded.max_sale)
+    ''', (sale_id,))
+
+def _rollup_remove(conn, day, payment_method, total):
+    updated = conn.execute('''
+        UPDATE daily_rollup SET sale_count = sale_count - 1, revenue = revenue - ?
+        WHERE day = ? AND payment_method = ? AND sale_count > 1 AND min_sale < ? AND max_sale > ?
+    ''', (total, day, payment_method, total, total)).rowcount
+    if not updated:
+        _rollup_refresh(conn, day, payment_method)
+
+def _rollup_refresh(conn, day, payment_method):
+    conn.execute('DELETE FROM daily_rollup WHERE day = ? AND payment_method = ?', (day, payment_method))
+    conn.execute(f'''
+        INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+        {_ROLLUP_SELECT}
+        WHERE sale_day = ? AND payment_method = ?
+        GROUP BY sale_day, payment_method
+    ''', (day, payment_method))
+
+def rebuild_daily_rollup():
+    # Recompute the whole rollup from sales (after bulk edits or a restore
+    # from an old backup). Returns the number of rollup rows.
+    with writer() as conn:
+        begin_immediate(conn)
+        conn.execute('DELETE FROM daily_rollup')
+        conn.execute(f'''
+            INSERT INTO daily_rollup (day, payment_method, sale_count, revenue, min_sale, max_sale)
+            {_ROLLUP_SELECT}
+            GROUP BY sale_day, payment_method
+        ''')
+        # Reports cached from the old rollup (on any till) must not be
+        # served as hits
+        conn.execute('UPDATE sales_generation SET generation = generation + 1')
+        return conn.execute('SELECT COUNT(*) FROM daily_rollup').fetchone()[0]
+
+
+# Reports
+
+# sales_summary, daily_sales and monthly_sales read daily_rollup, so their
+# cost grows with the number of days in the range, not the number of sales.
+#
+# Results are cached per lane by report and range (pos_cache.report_cache)
+# along with the sales generation and the highest sale id at the time.
+# Triggers bump the generation whenever a recorded sale is changed or
+# deleted, in any till (see pos_migrations), and a restore replaces it, so
+# while it holds the only news can be sales with higher ids: a repeat run
+# is served from the cache, or from the cache plus just the new sales when
+# there are some. Anything else recomputes the report.
+
+_REPORT_STATE = 'SELECT generation, (SELECT MAX(id) FROM sales) FROM sales_generation'
+
+def _cached_report(key, compute, fold):
+    # compute(conn) builds the report's state from scratch;
+    # fold(conn, state, after_id, upto_id) adds the sales with ids in
+    # (after_id, upto_id] to a copy of it
+    with reader() as conn:
+        # One snapshot for the check and the query behind it
+        conn.execute('BEGIN')
+        generation, high_water = conn.execute(_REPORT_STATE).fetchone()
+        high_water = high_water or 0
+        cached = report_cache.get(key)
+        if cached is not None and cached[0] == generation and cached[1] == high_water:
+            report_cache.count('hits')
+            return cached[2]
+        if cached is not None and cached[0] == generation and cached[1] < high_water:
+            report_cache.count('folds')
+            state = fold(conn, cached[2], cached[1], high_water)
+        else:
+            report_cache.count('misses')
+            state = compute(conn)
+    report_cache.put(key, generation, high_water, state)
+    return state
+
+def _new_sales(column, where):
+    # Restrict a day range WHERE clause to the sales (after_id, upto_id]
+    condition = f"{column} > ? AND {column} <= ?"
+    return f"{where} AND {condition}" if where else f" WHERE {condition}"
+
+def _round_div(amount, count):
+    # ROUND(1.0 * amount / count) as SQLite does it (halves away from zero)
+    sign = -1 if amount < 0 else 1
+    return sign * ((2 * abs(amount) + count) // (2 * count))
+
+def sales_summary(start_date=None, end_date=None):
+    where, params = day_range('day', start_date, end_date)
+    sales_where, sales_params = day_range('sale_day', start_date, end_date)
+
+    def compute(conn):
+        return tuple(conn.execute(f'''
+            SELECT COALESCE(SUM(sale_count), 0), SUM(revenue), MIN(min_sale), MAX(max_sale)
+            FROM daily_rollup
+            {where}
+        ''', params).fetchone())
+
+    def fold(conn, state, after_id, upto_id):
+        count, revenue, low, high = conn.execute(f'''
+            SELECT COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+            FROM sales
+            {_new_sales('id', sales_where)}
+        ''', sales_params + [after_id, upto_id]).fetchone()
+        if not count:
+            return state
+        if not state[0]:
+            return count, revenue, low, high
+        return state[0] + count, state[1] + revenue, min(state[2], low), max(state[3], high)
+
+    key = ('sales_summary', day_key(start_date) if start_date else None, day_key(end_date) if end_date else None)
+    count, revenue, low, high = _cached_report(key, compute, fold)
+    return {
+        'total_sales': count,
+        'total_revenue': revenue,
+        'avg_sale': _round_div(revenue, count) if count else None,
+        'min_sale': low,
+        'max_sale': high,
+    }
+
+def product_sales(start_date=None, end_date=None):
+    where, params = day_range('s.sale_day', start_date, end_date)
+
+    def totals(conn, where, params):
+        return {row[0]: (row[1], row[2], row[3]) for row in conn.execute(f'''
+            SELECT
+                p.id,
+                p.name,
+                SUM(si.quantity),
+                SUM(si.quantity * si.price)
+            FROM sale_items si
+            JOIN products p ON si.product_id = p.id
+            JOIN sales s ON si.sale_id = s.id
+            {where}
+            GROUP BY p.id, p.name
+        ''', params)}
+
+    def compute(conn):
+        return totals(conn, where, params)
+
+    def fold(conn, state, after_id, upto_id):
+        added = totals(conn, _new_sales('s.id', where), params + [after_id, upto_id])
+        if not added:
+            return state
+        state = dict(state)
+        for product_id, (name, quantity, revenue) in added.items():
+            old = state.get(product_id)
+            state[product_id] = (name, quantity, revenue) if old is None else \
+                (name, old[1] + quantity, old[2] + revenue)
+        return state
+
+    key = ('product_sales', day_key(start_date) if start_date else None, day_key(end_date) if end_date else None)
+    state = _cached_report(key, compute, fold)
+    return [{'id': product_id, 'name': name, 'total_quantity': quantity, 'total_revenue': revenue}
+            for product_id, (name, quantity, revenue) in sorted(state.items(), key=lambda item: (-item[1][2], item[0]))]
+
+def _fold_buckets(state, rows):
+    # Add (bucket, sales, revenue) rows to a copy of {bucket: (sales, revenue)}
+    state = dict(state)
+    for bucket, count, revenue in rows:
+        old = state.get(bucket, (0, 0))
+        state[bucket] = (old[0] + count, old[1] + revenue)
+    return state
+
+def daily_sales(start_date=None, end_date=None):
+    where, params = day_range('day', start_date, end_date)
+    sales_where, sales_params = day_range('sale_day', start_date, end_date)
+
+    def compute(conn):
+        return {row[0]: (row[1], row[2]) for row in conn.execute(f'''
+            SELECT day, SUM(sale_count), SUM(revenue)
+            FROM daily_rollup
+            {where}
+            GROUP BY day
+        ''', params)}
+
+    def fold(conn, state, after_id, upto_id):
+        return _fold_buckets(state, conn.execute(f'''
+            SELECT sale_day, COUNT(*), SUM(total_amount)
+            FROM sales
+            {_new_sales('id', sales_where)}
+            GROUP BY sale_day
+        ''', sales_params + [after_id, upto_id]).fetchall())
+
+    key = ('daily_sales', day_key(start_date) if start_date else None, day_key(end_date) if end_date else None)
+    state = _cached_report(key, compute, fold)
+    return [{'sale_day': f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}",
+             'total_sales': count, 'total_revenue': revenue}
+            for day, (count, revenue) in sorted(state.items(), reverse=True)]
+
+def monthly_sales(start_month=None, end_month=None):
+    # Months are YYYY-MM
+    where, params = month_range('day', start_month, end_month)
+    sales_where, sales_params = month_range('sale_day', start_month, end_month)
+
+    def compute(conn):
+        return {row[0]: (row[1], row[2]) for row in conn.execute(f'''
+            SELECT day / 100, SUM(sale_count), SUM(revenue)
+            FROM daily_rollup
+            {where}
+            GROUP BY day / 100
+        ''', params)}
+
+    def fold(conn, state, after_id, upto_id):
+        return _fold_buckets(state, conn.execute(f'''
+            SELECT sale_month, COUNT(*), SUM(total_amount)
+            FROM sales
+            {_new_sales('id', sales_where)}
+            GROUP BY sale_month
+        ''', sales_params + [after_id, upto_id]).fetchall())
+
+    key = ('monthly_sales', month_key(start_month) if start_month else None,
+           month_key(end_month) if end_month else None)
+    state = _cached_report(key, compute, fold)
+    return [{'sale_month': f"{month // 100:04d}-{month % 100:02d}",
+             'total_sales': count, 'total_revenue': revenue}
+            for month, (count, revenue) in sorted(state.items(), reverse=True)]
+
+
+# Dashboard: the four reports at once, each in its own thread on its own
+# read-only pool connection. sqlite3 lets go of the GIL while a query runs,
+# so they overlap, and in WAL mode a reader never blocks the writer, so
+# finalize on this or any till carries on meanwhile. Results are yielded
+# as each report finishes.
+
+DASHBOARD_REPORTS = ('sales_summary', 'daily_sales', 'monthly_sales', 'product_sales')
+
+def _timed(func, args):
+    start = time.perf_counter()
+    try:
+        return func(*args), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+def dashboard(start_date=None, end_date=None):
+    # Yields (report, result, error, seconds) in the order the reports
+    # finish. monthly_sales covers the whole months of the range.
+    low, high = day_key(start_date) if start_date else None, day_key(end_date) if end_date else None
+    months = (f"{low // 10000:04d}-{low // 100 % 100:02d}" if low else None,
+              f"{high // 10000:04d}-{high // 100 % 100:02d}" if high else None)
+    jobs = {
+        'sales_summary': (sales_summary, (start_date, end_date)),
+        'daily_sales': (daily_sales, (start_date, end_date)),
+        'monthly_sales': (monthly_sales, months),
+        'product_sales': (product_sales, (start_date, end_date)),
+    }
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='pos-dashboard') as pool:
+        futures = {pool.submit(_timed, *jobs[name]): name for name in DASHBOARD_REPORTS}
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
+
+
+# Settings
+
+def get_settings():
+    with reader() as conn:
+        return {row['key']: row['value'] for row in conn.execute('SELECT key, value FROM system_settings')}
+
+def set_settings(values):
+    # values: {key: value}, written in one transaction
+    with writer() as conn:
+        conn.executemany('''
+            INSERT INTO system_settings (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+        ''', [(key, str(value)) for key, value in values.items()])
+    # This process applies it on its next statement; other tills within
+    # pos_db.TRACE_REFRESH_SECONDS
+    query_stats.expire()
+
+def set_sql_trace(enabled, slow_query_ms=None):
+    # Switch SQL tracing on or off for every till
+    values = {'sql_trace': '1' if enabled else '0'}
+    if slow_query_ms is not None:
+        values['slow_query_ms'] = slow_query_ms
+    set_settings(values)
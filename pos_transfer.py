@@ -0,0 +1,316 @@
+import csv
+import gzip
+import io
+import json
+import os
+from pos_db import reader, writer, begin_immediate, with_retry
+from pos_cache import product_cache
+from pos_money import Money
+from pos_services import day_range
+
+# Bulk data in and out of the store database. Files are streamed row by row
+# and written in chunks, each chunk its own short IMMEDIATE transaction, so
+# memory stays flat and the tills are never locked out for long.
+
+IMPORT_CHUNK_ROWS = 5000
+
+PRODUCT_IMPORT_COLUMNS = ('barcode', 'name', 'price', 'stock')
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ExportResumeError(ValueError):
+    pass
+
+
+# Product import
+
+def _product_rows(reader, columns, rejected):
+    # Validate CSV rows into (barcode, name, price in cents, stock) tuples,
+    # stock None when the file has no stock column; bad rows go to rejected as
+    # (line, reason, row)
+    index = {column: columns.index(column) for column in PRODUCT_IMPORT_COLUMNS if column in columns}
+    has_stock = 'stock' in index
+    width = max(index.values()) + 1
+    for row in reader:
+        if not any(row):
+            continue
+        line = reader.line_num
+        if len(row) < width:
+            rejected(line, 'missing columns', row)
+            continue
+        barcode = row[index['barcode']].strip()
+        name = row[index['name']].strip()
+        if not barcode:
+            rejected(line, 'missing barcode', row)
+            continue
+        if not name:
+            rejected(line, 'missing name', row)
+            continue
+        try:
+            price = Money.parse(row[index['price']]).cents
+        except ValueError:
+            rejected(line, 'invalid price', row)
+            continue
+        if price < 0:
+            rejected(line, 'invalid price', row)
+            continue
+        if has_stock:
+            try:
+                stock = int(row[index['stock']])
+            except ValueError:
+                rejected(line, 'invalid stock', row)
+                continue
+            if stock < 0:
+                rejected(line, 'invalid stock', row)
+                continue
+            yield (barcode, name, price, stock)
+        else:
+            yield (barcode, name, price, None)
+
+def _upsert_sql(has_stock):
+    # Rows whose values are unchanged are skipped by the WHERE clause, so a
+    # nightly price file only rewrites the products that actually changed.
+    # Without a stock column existing stock is left alone.
+    stock = "stock = excluded.stock," if has_stock else ""
+    return f'''
+        INSERT INTO products (barcode, name, price, stock)
+        SELECT barcode, name, price, COALESCE(stock, 0) FROM temp.import_products WHERE true ORDER BY rowid
+        ON CONFLICT (barcode) DO UPDATE SET
+            name = excluded.name, price = excluded.price, {stock}
+            updated_at = CURRENT_TIMESTAMP
+        WHERE (name, price{", stock" if has_stock else ""}) IS NOT
+              (excluded.name, excluded.price{", excluded.stock" if has_stock else ""})
+    '''
+
+def _write_products(sql, chunk):
+    # One chunk in one transaction. The chunk is staged in a temp table and
+    # upserted with a single statement; the per-row search triggers are
+    # paused (bulk_load) and only new or renamed products are reindexed.
+    with writer() as conn:
+        begin_immediate(conn)
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS import_products (
+                barcode TEXT, name TEXT, price INTEGER, stock INTEGER, reindex INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('DELETE FROM temp.import_products')
+        conn.executemany('INSERT INTO temp.import_products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                         chunk)
+        conn.execute('INSERT INTO bulk_load DEFAULT VALUES')
+
+        new = conn.execute('''
+            SELECT COUNT(DISTINCT barcode) FROM temp.import_products i
+            WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.barcode = i.barcode)
+        ''').fetchone()[0]
+        conn.execute('''
+            UPDATE temp.import_products SET reindex = 1
+            WHERE barcode IN (SELECT i.barcode FROM temp.import_products i
+                              LEFT JOIN products p ON p.barcode = i.barcode
+                              WHERE p.id IS NULL OR p.name IS NOT i.name)
+        ''')
+        conn.execute('''
+            INSERT INTO products_fts (products_fts, rowid, name, barcode)
+            SELECT 'delete', p.id, p.name, p.barcode FROM products p
+            WHERE p.barcode IN (SELECT barcode FROM temp.import_products WHERE reindex)
+        ''')
+        changed = conn.execute(sql).rowcount
+        conn.execute('''
+            INSERT INTO products_fts (rowid, name, barcode)
+            SELECT p.id, p.name, p.barcode FROM products p
+            WHERE p.barcode IN (SELECT barcode FROM temp.import_products WHERE reindex)
+        ''')
+
+        # Renames show in product_sales; the trigger that would have let
+        # cached reports know is paused too
+        conn.execute('''
+            UPDATE sales_generation SET generation = generation + 1
+            WHERE EXISTS (SELECT 1 FROM temp.import_products WHERE reindex)
+        ''')
+        # Other tills reload their product caches (pos_cache)
+        if changed:
+            conn.execute('UPDATE products_generation SET generation = generation + 1')
+        conn.execute('DELETE FROM bulk_load')
+        conn.execute('DELETE FROM temp.import_products')
+    return new, changed
+
+def import_products(path, chunk_rows=IMPORT_CHUNK_ROWS, rejects_path=None, progress=None):
+    # Upsert products from a CSV file keyed on barcode. The header must name
+    # barcode, name and price; stock is optional (without it, stock of
+    # existing products is left alone and new products start at 0).
+    # Returns counts of inserted, updated, unchanged and rejected rows.
+    counts = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+    rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8') if rejects_path else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(['line', 'reason', 'row'])
+
+    def rejected(line, reason, row):
+        counts['rejected'] += 1
+        if rejects_writer:
+            rejects_writer.writerow([line, reason, ','.join(row)])
+
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            columns = [column.strip().lower() for column in header or []]
+            missing = [column for column in ('barcode', 'name', 'price') if column not in columns]
+            if missing:
+                raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+            sql = _upsert_sql('stock' in columns)
+
+            chunk = []
+            for row in _product_rows(reader, columns, rejected):
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    _count_chunk(counts, chunk, with_retry(_write_products, sql, chunk))
+                    chunk = []
+                    if progress:
+                        progress(counts)
+            if chunk:
+                _count_chunk(counts, chunk, with_retry(_write_products, sql, chunk))
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    counts['rows'] += counts['rejected']
+    # Reload this process's product cache if it is in use (a till running
+    # the import); the command line tool never fills it
+    if product_cache.stats()['size']:
+        product_cache.load()
+    return counts
+
+def _count_chunk(counts, chunk, result):
+    new, changed = result
+    counts['rows'] += len(chunk)
+    counts['inserted'] += new
+    counts['updated'] += changed - new
+    counts['unchanged'] += len(chunk) - changed
+
+
+# Sales export
+
+EXPORT_SEGMENT_SALES = 10000
+
+SALES_EXPORT_COLUMNS = (
+    'sale_id', 'sale_date', 'payment_method', 'cashier', 'customer_id', 'customer',
+    'sale_total', 'amount_paid', 'change_given',
+    'line_id', 'product_id', 'barcode', 'product', 'quantity', 'price', 'line_total',
+)
+
+def _sale_id_bounds(start_date, end_date):
+    where, params = day_range('sale_day', start_date, end_date)
+    with reader() as conn:
+        return tuple(conn.execute(f'SELECT MIN(id), MAX(id) FROM sales {where}', params).fetchone())
+
+def _sale_lines(first_id, last_id, start_date, end_date):
+    # One sale line per row for sales with first_id < id <= last_id in the
+    # date range, in sale id order, with amounts in currency units rather
+    # than cents. Rows are streamed from the cursor, so memory does not
+    # depend on how many lines the segment has.
+    where, params = day_range('s.sale_day', start_date, end_date)
+    date_filter = where.replace(' WHERE ', ' AND ', 1)
+    with reader() as conn:
+        cursor = conn.execute(f'''
+            SELECT s.id, s.sale_date, s.payment_method, u.full_name, s.customer_id, c.name,
+                   s.total_amount / 100.0, s.amount_paid / 100.0, s.change_given / 100.0,
+                   si.id, si.product_id, p.barcode, p.name, si.quantity, si.price / 100.0,
+                   si.quantity * si.price / 100.0
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            JOIN products p ON p.id = si.product_id
+            LEFT JOIN users u ON u.id = s.user_id
+            LEFT JOIN customers c ON c.id = s.customer_id
+            WHERE s.id > ? AND s.id <= ?{date_filter}
+            ORDER BY s.id
+        ''', [first_id, last_id, *params])
+        cursor.row_factory = None
+        yield from cursor
+
+def _open_segment(raw, compress):
+    # Each segment is written as its own gzip member, so a checkpoint always
+    # falls on a member boundary and a resumed file stays a valid gzip stream
+    stream = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+def _close_segment(text, compress):
+    text.flush()
+    stream = text.detach()
+    if compress:
+        stream.close()
+
+def _row_writer(text, fmt):
+    if fmt == 'csv':
+        return csv.writer(text).writerow
+
+    def write(row):
+        text.write(json.dumps(dict(zip(SALES_EXPORT_COLUMNS, row))) + '\n')
+    return write
+
+def _write_checkpoint(path, state):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+def export_sales(path, start_date=None, end_date=None, fmt='csv', compress=False, resume=False,
+                 checkpoint_path=None, segment_sales=EXPORT_SEGMENT_SALES, progress=None):
+    # Stream sales joined with their lines, products, customers and cashiers
+    # to CSV or JSON lines, optionally gzipped. The work is split into
+    # segments of segment_sales sale ids, each read in its own short read
+    # transaction; after each segment the output is synced and the last
+    # sale id and file offset saved to the checkpoint file. With resume=True
+    # an interrupted export continues from its checkpoint. Returns the
+    # number of sales and lines in the file.
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown export format: {fmt}")
+    checkpoint_path = checkpoint_path or path + '.checkpoint'
+    options = {'path': os.path.abspath(path), 'format': fmt, 'gzip': compress,
+               'start_date': start_date or None, 'end_date': end_date or None}
+
+    state = None
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            state = json.load(f)
+        if {key: state.get(key) for key in options} != options:
+            raise ExportResumeError("The checkpoint was written by an export with different options.")
+    if state is None:
+        first_id, last_id = _sale_id_bounds(start_date, end_date)
+        state = dict(options, first_id=first_id, last_id=last_id, done_id=(first_id or 1) - 1,
+                     offset=0, sales=0, lines=0)
+
+    with open(path, 'r+b' if state['offset'] else 'wb') as raw:
+        # Drop anything written after the last checkpoint
+        raw.truncate(state['offset'])
+        raw.seek(state['offset'])
+        if state['offset'] == 0 and fmt == 'csv':
+            text = _open_segment(raw, compress)
+            csv.writer(text).writerow(SALES_EXPORT_COLUMNS)
+            _close_segment(text, compress)
+        while state['last_id'] is not None and state['done_id'] < state['last_id']:
+            segment_end = min(state['done_id'] + segment_sales, state['last_id'])
+            text = _open_segment(raw, compress)
+            write = _row_writer(text, fmt)
+            sale_id = None
+            for row in _sale_lines(state['done_id'], segment_end, start_date, end_date):
+                if row[0] != sale_id:
+                    sale_id = row[0]
+                    state['sales'] += 1
+                write(row)
+                state['lines'] += 1
+            _close_segment(text, compress)
+            raw.flush()
+            os.fsync(raw.fileno())
+            state['done_id'] = segment_end
+            state['offset'] = raw.tell()
+            _write_checkpoint(checkpoint_path, state)
+            if progress:
+                progress(state)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {'sales': state['sales'], 'lines': state['lines']}
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pos_db
+import pos_services as services
+from pos_migrations import migrate
+
+# Customer search at the till (pos_services.search_customers)
+#
+# python -m pytest tests        (or python -m unittest discover tests)
+
+
+class CustomerSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        pos_db.close_pool()
+        self.db_path = pos_db.DB_PATH
+        pos_db.DB_PATH = os.path.join(self.directory.name, 'pos_database.db')
+        with pos_db.writer() as conn:
+            migrate(conn)
+
+    def tearDown(self):
+        pos_db.close_pool()
+        pos_db.DB_PATH = self.db_path
+        self.directory.cleanup()
+
+    def _emails(self, text):
+        return [customer['email'] for customer in services.search_customers(text)]
+
+    def test_mixed_case_email_prefix(self):
+        for email in ('Ann@Quiz.com', 'ann@quizz.org', 'ann@qui.net', 'bob@quiz.com'):
+            services.add_customer('Ann', email=email)
+        self.assertEqual(self._emails('ANN@QUIZ'), ['Ann@Quiz.com', 'ann@quizz.org'])
+        self.assertEqual(self._emails('ann@QuiZ.c'), ['Ann@Quiz.com'])
+
+    def test_email_prefix_ending_at_the_at_sign(self):
+        for email in ('Jo@example.com', 'jo_b@example.com', 'joe@example.com'):
+            services.add_customer('Jo', email=email)
+        self.assertEqual(self._emails('JO@'), ['Jo@example.com'])
+
+    def test_name_matches_best_first(self):
+        for name in ('Carla Mendes', 'Carlos Mwangi', 'Carlos Mendes'):
+            services.add_customer(name)
+        names = [customer['name'] for customer in services.search_customers('carlos m')]
+        self.assertEqual(names, ['Carlos Mendes', 'Carlos Mwangi'])
+
+
+if __name__ == '__main__':
+    unittest.main()
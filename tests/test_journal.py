@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pos_journal import SalesJournal
+
+# Crash recovery of the sales journal (pos_journal).
+#
+# python -m pytest tests        (or python -m unittest discover tests)
+
+
+def _entry(number):
+    return {'key': f"t-{number}", 'total': number}
+
+
+class Recorder:
+    # Stands in for record_journal_sales: keeps the keys it was given
+
+    def __init__(self):
+        self.keys = []
+
+    def __call__(self, entries):
+        self.keys.extend(entry['key'] for entry in entries)
+
+
+class JournalRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'lane.journal')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _crash(self, journal):
+        # Drop the journal without draining or closing it cleanly
+        journal._file.close()
+
+    def test_torn_tail_is_cut_and_whole_records_are_kept(self):
+        journal = SalesJournal(self.path, Recorder())
+        for number in range(3):
+            journal.append(_entry(number))
+        good_size = os.path.getsize(self.path)
+        self._crash(journal)
+        with open(self.path, 'ab') as f:
+            # Header of a fourth record and part of its payload
+            f.write(b'\x40\x00\x00\x00\x01\x02\x03\x04{"key":')
+
+        recorder = Recorder()
+        journal = SalesJournal(self.path, recorder)
+        self.assertEqual(os.path.getsize(self.path), good_size)
+        self.assertTrue(any(name.startswith('lane.journal.damaged-') for name in os.listdir(self.directory.name)))
+        journal.drain()
+        journal.close()
+        self.assertEqual(recorder.keys, ['t-0', 't-1', 't-2'])
+
+    def test_record_with_bad_checksum_ends_the_journal(self):
+        journal = SalesJournal(self.path, Recorder())
+        journal.append(_entry(0))
+        first_size = os.path.getsize(self.path)
+        journal.append(_entry(1))
+        self._crash(journal)
+        with open(self.path, 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'##')
+
+        recorder = Recorder()
+        journal = SalesJournal(self.path, recorder)
+        self.assertEqual(os.path.getsize(self.path), first_size)
+        journal.drain()
+        journal.close()
+        self.assertEqual(recorder.keys, ['t-0'])
+
+    def test_drain_checkpoints_and_compacts(self):
+        recorder = Recorder()
+        journal = SalesJournal(self.path, recorder)
+        for number in range(5):
+            journal.append(_entry(number))
+        self.assertEqual(journal.drain(), 5)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        with open(journal.checkpoint_path) as f:
+            self.assertEqual(json.load(f), {'offset': 0})
+        journal.append(_entry(5))
+        journal.close()
+        self.assertEqual(recorder.keys, [f"t-{number}" for number in range(6)])
+
+    def test_crash_during_compaction_replays_instead_of_skipping(self):
+        # A power cut between resetting the checkpoint and truncating the
+        # file leaves applied records behind a zero checkpoint: they are
+        # replayed (the database skips them by key), never skipped over
+        journal = SalesJournal(self.path, Recorder())
+        for number in range(3):
+            journal.append(_entry(number))
+
+        class PowerCut(Exception):
+            pass
+
+        class File:
+            def __init__(self, f):
+                self.f = f
+
+            def truncate(self, size):
+                raise PowerCut()
+
+            def __getattr__(self, name):
+                return getattr(self.f, name)
+
+        journal._file = File(journal._file)
+        with self.assertRaises(PowerCut):
+            journal.drain()
+        self._crash(journal)
+
+        recorder = Recorder()
+        journal = SalesJournal(self.path, recorder)
+        journal.append(_entry(3))
+        journal.close()
+        self.assertEqual(recorder.keys, ['t-0', 't-1', 't-2', 't-3'])
+
+
+# A till selling as fast as it can with the journal on. It prints the
+# journal key of every sale finalize has acknowledged. In 'sell-held' mode
+# the background writer never starts, so every sale is still only in the
+# journal when the till is killed and has to be recovered on the next
+# start.
+TILL = '''
+import os, random, sys
+sys.path.insert(0, sys.argv[1])
+import pos_journal
+import pos_system
+import pos_services as services
+from pos_db import writer
+from pos_cache import product_cache
+from pos_cart import Cart
+from pos_money import Money
+
+pos_system.init_db()
+with writer() as conn:
+    if not conn.execute('SELECT COUNT(*) FROM products WHERE stock > 1000').fetchone()[0]:
+        conn.executemany('INSERT INTO products (barcode, name, price, stock) VALUES (?, ?, ?, ?)',
+                         ((f"crash{i:06d}", f"Crash product {i}", 100 + i, 10 ** 9) for i in range(50)))
+product_cache.load()
+ids = [p['id'] for p in services.list_products() if p['stock'] > 1000]
+if sys.argv[2] == 'sell-held':
+    pos_journal.SalesJournal.start = lambda journal: None
+services.open_sales_journal(os.environ['POS_SALES_JOURNAL'])
+if sys.argv[2] == 'recover':
+    services.close_sales_journal()
+    sys.exit(0)
+rng = random.Random()
+while True:
+    cart = Cart(1)
+    for _ in range(rng.randint(1, 4)):
+        services.add_to_cart(cart, product_id=rng.choice(ids))
+    receipt = services.finalize(cart, 1, cart.total + Money(500))
+    print('ACK', receipt['journal_key'], flush=True)
+'''
+
+
+@unittest.skipIf(os.name == 'nt', 'needs SIGKILL')
+class JournalKillTest(unittest.TestCase):
+    # Kill -9 a till in the middle of finalize bursts, start it again and
+    # check that every sale it acknowledged is in the database, once
+
+    ROUNDS = 5
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ,
+                        POS_DB_PATH=os.path.join(self.directory.name, 'pos_database.db'),
+                        POS_SALES_JOURNAL=os.path.join(self.directory.name, 'lane1.journal'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _till(self, mode):
+        return subprocess.Popen([sys.executable, '-c', TILL, ROOT, mode], env=self.env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def test_acknowledged_sales_survive_kill(self):
+        rng = random.Random(1)
+        acknowledged = set()
+        for number in range(self.ROUNDS):
+            till = self._till('sell-held' if number % 2 == 0 else 'sell')
+            wanted = rng.randint(20, 300)
+            seen = 0
+            for line in till.stdout:
+                if line.startswith('ACK '):
+                    acknowledged.add(line.split()[1])
+                    seen += 1
+                    if seen >= wanted:
+                        break
+            till.send_signal(signal.SIGKILL)
+            # Sales acknowledged between the last read and the kill count too
+            rest, errors = till.communicate()
+            acknowledged.update(line.split()[1] for line in rest.splitlines() if line.startswith('ACK '))
+            self.assertGreater(seen, 0, errors)
+
+        recover = self._till('recover')
+        _, errors = recover.communicate(timeout=120)
+        self.assertEqual(recover.returncode, 0, errors)
+
+        with sqlite3.connect(self.env['POS_DB_PATH']) as conn:
+            keys = [row[0] for row in conn.execute('SELECT journal_key FROM sales WHERE journal_key IS NOT NULL')]
+            rollup = conn.execute('SELECT SUM(sale_count), SUM(revenue) FROM daily_rollup').fetchone()
+            totals = conn.execute('SELECT COUNT(*), SUM(total_amount) FROM sales').fetchone()
+        self.assertEqual(len(keys), len(set(keys)), 'a journalled sale was recorded twice')
+        self.assertEqual(acknowledged - set(keys), set(), 'acknowledged sales were lost')
+        self.assertEqual(tuple(rollup), tuple(totals))
+
+
+if __name__ == '__main__':
+    unittest.main()
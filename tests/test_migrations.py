@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pos_migrations import LATEST_VERSION, MIGRATIONS, MigrationError, migrate, schema_version
+
+# A database created from pos_database.py must open like one built by the
+# migrations from empty.
+#
+# python -m pytest tests        (or python -m unittest discover tests)
+
+TABLES = ('products', 'customers', 'sales', 'sale_items', 'daily_rollup')
+
+
+def _connect():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _from_script(version=None):
+    conn = _connect()
+    with open(os.path.join(ROOT, 'pos_database.py')) as f:
+        conn.executescript(f.read())
+    if version is not None:
+        conn.execute(f'PRAGMA user_version = {version}')
+    return conn
+
+
+def _shape(conn, table):
+    return [tuple(row) for row in conn.execute(f'PRAGMA table_xinfo({table})')]
+
+
+class SchemaScriptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.migrated = _connect()
+        migrate(self.migrated)
+
+    def tearDown(self):
+        self.migrated.close()
+
+    def _assert_same_shape(self, conn):
+        for table in TABLES:
+            self.assertEqual(_shape(conn, table), _shape(self.migrated, table), table)
+
+    def test_script_is_at_the_latest_version(self):
+        conn = _from_script()
+        self.assertEqual(schema_version(conn), LATEST_VERSION)
+        self.assertEqual(migrate(conn), [])
+        self._assert_same_shape(conn)
+
+    def test_unversioned_script_database_migrates(self):
+        # Created before the script set user_version: every migration runs
+        conn = _from_script(version=0)
+        migrate(conn)
+        self.assertEqual(schema_version(conn), LATEST_VERSION)
+        self._assert_same_shape(conn)
+        conn.execute("INSERT INTO sales (user_id, total_amount, amount_paid, change_given, payment_method,"
+                     " sale_date, journal_key) VALUES (1, 100, 100, 0, 'cash', '2024-06-01 10:00:00', 'k1')")
+        self.assertEqual(conn.execute('SELECT sale_day FROM sales').fetchone()[0], 20240601)
+
+
+class RebuildForeignKeyTest(unittest.TestCase):
+
+    def test_rebuild_with_orphaned_rows_is_refused(self):
+        # A version 2 database with a sale line whose sale is gone: the
+        # migration 3 rebuild must not carry it over silently
+        conn = _connect()
+        for version, _, apply, _ in MIGRATIONS[:2]:
+            apply(conn)
+        conn.execute('PRAGMA user_version = 2')
+        conn.execute("INSERT INTO products (barcode, name, price, stock) VALUES ('1', 'Coffee', 4.99, 5)")
+        conn.execute('INSERT INTO sale_items (sale_id, product_id, quantity, price) VALUES (999, 1, 1, 4.99)')
+        conn.commit()
+
+        with self.assertRaises(MigrationError):
+            migrate(conn)
+        self.assertEqual(schema_version(conn), 2)
+        self.assertEqual(conn.execute('PRAGMA foreign_keys').fetchone()[0], 1)
+        # Rolled back: sale_items still has its old foreign keys
+        on_delete = {row['table']: row['on_delete'] for row in conn.execute('PRAGMA foreign_key_list(sale_items)')}
+        self.assertEqual(on_delete['sales'], 'NO ACTION')
+
+        conn.execute('DELETE FROM sale_items WHERE sale_id = 999')
+        conn.commit()
+        migrate(conn)
+        self.assertEqual(schema_version(conn), LATEST_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()